@@ -0,0 +1,141 @@
+"""Adaptive temporal resolution: flat stretches of timesteps solved as one period.
+
+Consecutive timesteps are merged into a segment as long as each of the six
+profils series stays within ``tol`` (relative to its largest value) of its
+range over the segment, up to ``max_length`` timesteps; night-time PV and
+demand plateaus collapse while ramps keep their quarter-hours. The model is
+built on the segment means with every segment weighted by its length, so
+the gas storage moves by ``length * flow`` per segment and the horizon
+totals are sums over the original timesteps. Since flows are constant
+within a segment, the storage level is linear there and its max/min
+envelopes are reached at segment ends: the storage dynamics and envelopes
+of the expanded solution are exact.
+
+The solution is expanded back to the original timesteps. The only error
+comes from the profiles replaced by their segment means; it is reported
+as the largest deviation of every profile and the largest violation of
+every constraint block of the full model by the expanded solution.
+
+    python adaptive_resolution.py --end 35121 --tol 0.02 --compare
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backends import Solution, get_backend
+from model_builder import Layout, build_program
+from profile_store import data_folder, load_profiles
+
+
+def segment_lengths(profiles, end=None, tol=0.01, max_length=96):
+    """Lengths of the consecutive segments of ``[0, end)`` whose profiles stay within ``tol``."""
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    values = np.array([np.asarray(series[:end], dtype=float) for series in profiles.values()])
+    values /= np.maximum(np.abs(values).max(axis=1, keepdims=True), 1e-12)
+    lengths = []
+    start = 0
+    low = high = values[:, 0].tolist()
+    for t, column in enumerate(values.T.tolist()):
+        if t > start:
+            low = [min(a, b) for a, b in zip(low, column)]
+            high = [max(a, b) for a, b in zip(high, column)]
+            if t - start >= max_length or any(b - a > tol for a, b in zip(low, high)):
+                lengths.append(t - start)
+                start = t
+                low = high = column
+    lengths.append(end - start)
+    return np.array(lengths)
+
+
+def segment_means(profiles, lengths):
+    """Mean of every profile over each segment."""
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    end = int(np.sum(lengths))
+    return {name: np.add.reduceat(np.asarray(series[:end], dtype=float), starts) / lengths
+            for name, series in profiles.items()}
+
+
+def expand(solution, lengths):
+    """Solution on the original timesteps from the solution on the segments."""
+    reduced = solution.layout
+    end = int(np.sum(lengths))
+    layout = Layout(end, reduced.topology)
+    x = np.empty(layout.n_cols)
+    flows = solution.x[:reduced.cum_sum.start].reshape(len(reduced.links), reduced.end)
+    x[:layout.cum_sum.start] = np.repeat(flows, lengths, axis=1).ravel()
+    # level before the first segment, then the exact linear course within the segments
+    storage = np.repeat(solution.link(*reduced.topology.storage), lengths)
+    initial = solution.cum_sum[0] - lengths[0] * solution.link(*reduced.topology.storage)[0]
+    x[layout.cum_sum] = initial + np.cumsum(storage)
+    x[layout.cum_sum.stop:] = solution.x[reduced.cum_sum.stop:]
+    return Solution(layout, x, dict(solution.objective_values), solution.status, solution.runtime,
+                    solution.backend, solution.stats)
+
+
+def error_bound(profiles, means, lengths, solution, params=None, secondary='storage'):
+    """Largest profile deviation from the segment means and largest row violation per block.
+
+    The violations are those of the expanded ``solution`` in the full model
+    of ``profiles`` (general constraints excluded).
+    """
+    end = int(np.sum(lengths))
+    deviation = {name: float(np.abs(np.asarray(series[:end], dtype=float) - np.repeat(means[name], lengths)).max())
+                 for name, series in profiles.items()}
+    program = build_program(profiles, end, params, secondary, envelope='genconstr', presolve=False)
+    rows = {}
+    for block in program.blocks:
+        residual = block.A @ solution.x - block.rhs
+        if block.sense == '<':
+            residual = np.maximum(residual, 0.0)
+        elif block.sense == '>':
+            residual = np.maximum(-residual, 0.0)
+        rows[block.name] = float(np.abs(residual).max())
+    return {'profiles': deviation, 'rows': rows, 'max_row': max(rows.values())}
+
+
+def adaptive_solve(profiles, end=None, tol=0.01, max_length=96, params=None, secondary='storage',
+                   backend=None, check=True, **options):
+    """Solve on the segments of ``segment_lengths`` and expand to the original timesteps.
+
+    The returned Solution has ``lengths`` (the segment lengths),
+    ``reduced`` (the solution on the segments) and, with ``check``,
+    ``error`` (see error_bound).
+    """
+    start = time.perf_counter()
+    lengths = segment_lengths(profiles, end, tol, max_length)
+    means = segment_means(profiles, lengths)
+    program = build_program(means, len(lengths), params, secondary, weights=lengths)
+    reduced = get_backend(backend, **options).solve(program)
+    solution = expand(reduced, lengths)
+    solution.lengths = lengths
+    solution.reduced = reduced
+    if check:
+        solution.error = error_bound(profiles, means, lengths, solution, params, secondary)
+    solution.runtime = time.perf_counter() - start
+    return solution
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--end', type=int, default=35121)
+    parser.add_argument('--tol', type=float, default=0.01)
+    parser.add_argument('--max-length', type=int, default=96)
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--backend')
+    parser.add_argument('--folder', default=data_folder)
+    parser.add_argument('--compare', action='store_true', help='also solve the full model')
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.folder, args.end)
+    solution = adaptive_solve(profiles, args.end, args.tol, args.max_length, secondary=args.secondary,
+                              backend=args.backend)
+    print('%d timesteps merged into %d segments' % (args.end, len(solution.lengths)))
+    print(solution.objective_values, '%.2f s' % solution.runtime)
+    print('largest row violation %.4g' % solution.error['max_row'])
+    for name, value in solution.error['profiles'].items():
+        print('  %-20s deviation %.4g' % (name, value))
+    if args.compare:
+        full = get_backend(args.backend).solve(build_program(profiles, args.end, secondary=args.secondary))
+        print('full', full.objective_values, '%.2f s' % full.runtime)
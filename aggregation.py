@@ -0,0 +1,130 @@
+"""Representative-day aggregation for fast design screening.
+
+The six profils series are cut into days, each day becomes one vector of
+its normalized quarter-hour values, and k-means groups the days into ``k``
+clusters. The day closest to each centroid (the medoid) represents its
+cluster: the energy_system model is built on the ``k`` medoid days only,
+chronologically ordered, with every timestep weighted by the size of its
+cluster. Annual totals and full-horizon series are mapped back through the
+cluster labels; ``screen`` reports the error against a full solve per k.
+"""
+import time
+
+import numpy as np
+from scipy.cluster.vq import kmeans2
+
+from backends import solve
+from model_builder import build_program
+from results import Results
+
+day = 96
+
+
+def day_vectors(profiles, n_days, steps_per_day=day):
+    """``(n_days, n_profiles * steps_per_day)`` matrix of max-normalized daily profiles."""
+    columns = []
+    for series in profiles.values():
+        series = np.asarray(series[:n_days * steps_per_day], dtype=float)
+        scale = np.abs(series).max() or 1.0
+        columns.append((series / scale).reshape(n_days, steps_per_day))
+    return np.hstack(columns)
+
+
+def cluster_days(profiles, k, end=None, steps_per_day=day, seed=0):
+    """Return ``(medoids, labels)``: the representative day of each cluster
+    in chronological order and the cluster number of every day."""
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    n_days = end // steps_per_day
+    vectors = day_vectors(profiles, n_days, steps_per_day)
+    if k >= n_days:
+        return np.arange(n_days), np.arange(n_days)
+    centroids, labels = kmeans2(vectors, k, minit='++', seed=seed)
+    medoids = []
+    for cluster in np.unique(labels):  # k-means may leave clusters empty
+        members = np.flatnonzero(labels == cluster)
+        distance = ((vectors[members] - centroids[cluster]) ** 2).sum(axis=1)
+        medoids.append(members[distance.argmin()])
+    medoids = np.sort(medoids)
+    # relabel the days by the chronological rank of their medoid
+    rank = {labels[medoid]: i for i, medoid in enumerate(medoids)}
+    return medoids, np.array([rank[label] for label in labels])
+
+
+class AggregatedSolution:
+    """Solution on the representative days plus the day-to-cluster mapping."""
+
+    def __init__(self, solution, medoids, labels, steps_per_day, runtime):
+        self.solution = solution
+        self.results = Results(solution)
+        self.medoids = medoids
+        self.labels = labels
+        self.steps_per_day = steps_per_day
+        self.runtime = runtime
+
+    @property
+    def objective_values(self):
+        return self.solution.objective_values
+
+    def totals(self):
+        """Annual totals keyed like reject_1.json."""
+        return self.results.totals()
+
+    def expand(self, series):
+        """Map a series on the representative days back to every day of the horizon."""
+        days = np.asarray(series).reshape(len(self.medoids), self.steps_per_day)
+        return days[self.labels].ravel()
+
+    def link(self, src, dst):
+        return self.expand(self.results[src, dst])
+
+
+def aggregated_solve(profiles, k, end=None, params=None, secondary='storage', steps_per_day=day,
+                     seed=0, backend=None, **options):
+    """Solve the energy_system model on ``k`` representative days.
+
+    Only whole days are modelled; a trailing partial day is left out.
+    """
+    start = time.perf_counter()
+    medoids, labels = cluster_days(profiles, k, end, steps_per_day, seed)
+    steps = (medoids[:, None] * steps_per_day + np.arange(steps_per_day)).ravel()
+    reduced = {name: np.asarray(series)[steps] for name, series in profiles.items()}
+    weights = np.repeat(np.bincount(labels, minlength=len(medoids)), steps_per_day)
+    program = build_program(reduced, len(steps), params, secondary, weights=weights)
+    solution = solve(program, backend, **options)
+    return AggregatedSolution(solution, medoids, labels, steps_per_day, time.perf_counter() - start)
+
+
+def relative_error(value, reference):
+    return abs(value - reference) / max(abs(reference), 1e-9)
+
+
+def screen(profiles, ks, end=None, params=None, secondary='storage', steps_per_day=day,
+           backend=None, full=None, **options):
+    """Compare aggregated solves for each k in ``ks`` with the full-horizon solve.
+
+    ``full`` may pass an already computed full solution. Returns one row
+    per k with the solve time, the relative error on ext_feeder and the
+    largest relative error over the annual totals.
+    """
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    end = end // steps_per_day * steps_per_day
+    if full is None:
+        full = solve(build_program(profiles, end, params, secondary), backend, **options)
+    full_totals = Results(full).totals()
+    rows = []
+    for k in ks:
+        aggregated = aggregated_solve(profiles, k, end, params, secondary, steps_per_day,
+                                      backend=backend, **options)
+        totals = aggregated.totals()
+        rows.append({
+            'k': k,
+            'time': aggregated.runtime,
+            'full_time': full.runtime,
+            'ext_feeder_error': relative_error(aggregated.objective_values['Ext_feeder'],
+                                               full.objective_values['Ext_feeder']),
+            'totals_error': max(relative_error(totals[name], value)
+                                for name, value in full_totals.items() if abs(value) > 1e-6),
+        })
+    return rows
@@ -0,0 +1,551 @@
+"""Pluggable solver backends for the model_builder LinearProgram.
+
+Every backend loads the neutral sparse program once and solves its
+objectives lexicographically: each objective is minimized, then bounded by
+its optimum plus ``rel_tol`` before the next one. A loaded model can be
+updated in place and re-solved from its previous basis (see
+persistent.py). Gurobi is used when a license is available, HiGHS
+(highspy, or the copy bundled in scipy.optimize.linprog) otherwise.
+"""
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from profiling import phase
+
+
+class Solution:
+    """Column values laid out by ``layout`` plus the value of each objective."""
+
+    def __init__(self, layout, x, objective_values, status, runtime, backend, stats=None):
+        self.layout = layout
+        self.x = x
+        self.objective_values = objective_values
+        self.status = status
+        self.runtime = runtime
+        self.backend = backend
+        self.stats = stats or {}
+
+    def link(self, src, dst):
+        return self.x[self.layout.link(src, dst)]
+
+    @property
+    def cum_sum(self):
+        return self.x[self.layout.cum_sum]
+
+    def scalar(self, name):
+        return self.x[self.layout.scalars[name]]
+
+
+class Backend:
+    """Lexicographic solve loop; subclasses implement the solver calls.
+
+    ``threads``, ``time_limit``, ``mip_gap`` and ``verbose`` are translated
+    to the native parameter of each solver; ``presolve_stats`` adds the
+    presolved model size to the statistics (one extra presolve). After
+    ``load`` the model stays in the solver: blocks can be updated in place
+    with ``change_rhs``, ``change_coefficients`` and ``change_bounds`` and
+    ``run`` re-solves from the previous basis.
+    """
+    name = None
+    # whether set_start is used by the solver
+    warm_start = False
+
+    def __init__(self, threads=None, time_limit=None, mip_gap=None, verbose=False, presolve_stats=False):
+        self.threads = threads
+        self.time_limit = time_limit
+        self.mip_gap = mip_gap
+        self.verbose = verbose
+        self.presolve_stats = presolve_stats
+
+    @classmethod
+    def available(cls):
+        raise NotImplementedError
+
+    def load_program(self, program):
+        raise NotImplementedError
+
+    def set_objective(self, c):
+        raise NotImplementedError
+
+    def add_bound_row(self, c):
+        """Add the row ``c @ x <= +inf`` and return its handle."""
+        raise NotImplementedError
+
+    def set_bound(self, row, upper):
+        raise NotImplementedError
+
+    def change_rhs(self, block, rhs):
+        """New right-hand side for every row of block number ``block``."""
+        raise NotImplementedError
+
+    def change_coefficients(self, block, rows, cols, values):
+        """``A[rows, cols] = values`` inside block number ``block``."""
+        raise NotImplementedError
+
+    def change_bounds(self, lb, ub):
+        raise NotImplementedError
+
+    def optimize(self):
+        """Return ``(status, objective value)``."""
+        raise NotImplementedError
+
+    def values(self):
+        raise NotImplementedError
+
+    def set_start(self, x):
+        """Start the next optimize from the point ``x`` (columns of the loaded program).
+
+        Backends without warm start (``warm_start`` False) ignore it.
+        """
+
+    def stats(self):
+        """Statistics of the last optimize: model size, iterations and solver runtime."""
+        return {}
+
+    def presolved_size(self):
+        """``(columns, rows)`` left after presolve."""
+        raise NotImplementedError
+
+    def duals(self):
+        """Row duals of the program blocks (stacked in block order) after the last optimize.
+
+        Only available for linear programs; the sign convention is
+        ``d objective / d rhs`` for a minimization.
+        """
+        raise NotImplementedError
+
+    def load(self, program):
+        with phase('load'):
+            self.load_program(program)
+            # degradation rows of all but the last objective, relaxed until run() bounds them
+            self.bound_rows = [self.add_bound_row(objective.c) for objective in program.objectives[:-1]]
+
+    def run(self, program):
+        """Solve the loaded model for the objectives of ``program``.
+
+        The status is 'time_limit' when an objective stopped at the time
+        limit on a feasible incumbent; the later objectives are then bounded
+        by the incumbent value. ``objective_values`` are the values of the
+        returned solution, the optimum of each stage is kept as
+        ``stats[name]['optimum']``.
+        """
+        start = time.perf_counter()
+        for row in self.bound_rows:
+            self.set_bound(row, np.inf)
+        optima = {}
+        stats = {}
+        status = None
+        limited = False
+        for k, objective in enumerate(program.objectives):
+            if k:
+                previous = program.objectives[k - 1]
+                value = optima[previous.name]
+                self.set_bound(self.bound_rows[k - 1], value + previous.rel_tol * abs(value))
+            self.set_objective(objective.c)
+            with phase('optimize/' + objective.name):
+                optimize_start = time.perf_counter()
+                status, value = self.optimize()
+            stats[objective.name] = dict(self.stats(), seconds=time.perf_counter() - optimize_start, optimum=value)
+            if status not in ('optimal', 'time_limit'):
+                raise RuntimeError('%s: objective %r ended with status %s' % (self.name, objective.name, status))
+            if status == 'time_limit':
+                # the next objectives are bounded by a feasible value, the solution is not optimal
+                limited = True
+            optima[objective.name] = value
+        if self.presolve_stats:
+            with phase('presolve_stats'):
+                stats['presolved_cols'], stats['presolved_rows'] = self.presolved_size()
+        with phase('extract'):
+            x = self.values()
+        # the later stages may degrade the earlier objectives by their rel_tol
+        objective_values = {objective.name: float(objective.c @ x) for objective in program.objectives}
+        # flows fixed by the builder presolve are put back in place
+        layout = program.layout
+        status = 'time_limit' if limited else status
+        return Solution(layout.full, layout.expand(x), objective_values, status, time.perf_counter() - start,
+                        self.name, stats)
+
+    def solve(self, program):
+        start = time.perf_counter()
+        self.load(program)
+        solution = self.run(program)
+        solution.runtime = time.perf_counter() - start
+        return solution
+
+
+class GurobiBackend(Backend):
+    name = 'gurobi'
+    warm_start = True
+
+    # columns above the limit of the size-limited license that comes with the pip package
+    restricted_size = 2001
+    _available = None
+
+    @classmethod
+    def available(cls):
+        """Whether a license able to solve more than ``restricted_size`` columns starts.
+
+        The size-limited license always starts but fails on the models of
+        the scripts, so it does not count as available.
+        """
+        if cls._available is None:
+            try:
+                import gurobipy
+                env = gurobipy.Env(empty=True)
+                env.setParam('OutputFlag', 0)
+                env.start()
+                model = gurobipy.Model(env=env)
+                model.addMVar(cls.restricted_size)
+                model.optimize()
+                model.dispose()
+                env.dispose()
+            except Exception:
+                cls._available = False
+            else:
+                cls._available = True
+        return cls._available
+
+    def load_program(self, program):
+        from gurobipy import GRB, Model
+
+        m = Model('energy_system')
+        m.Params.OutputFlag = int(self.verbose)
+        if self.threads is not None:
+            m.Params.Threads = self.threads
+        if self.time_limit is not None:
+            m.Params.TimeLimit = self.time_limit
+        if self.mip_gap is not None:
+            m.Params.MIPGap = self.mip_gap
+        x = m.addMVar(program.n_cols, lb=program.lb, ub=program.ub)
+        self.constrs = []
+        for block in program.blocks:
+            with phase(block.name):
+                self.constrs.append(m.addMConstr(block.A, x, block.sense, block.rhs, name=block.name))
+        self.columns = None
+        if program.general:
+            columns = self.column_list(x)
+            for constr in program.general:
+                add = m.addGenConstrMax if constr.kind == 'max' else m.addGenConstrMin
+                add(columns[constr.res], [columns[col] for col in constr.cols], constr.constant)
+        m.ModelSense = GRB.MINIMIZE
+        self.model = m
+        self.x = x
+        self.last_x = None
+        self.is_mip = bool(program.general)
+
+    def column_list(self, x=None):
+        if self.columns is None:
+            self.columns = (self.x if x is None else x).tolist()
+        return self.columns
+
+    def set_objective(self, c):
+        self.x.Obj = c
+
+    def add_bound_row(self, c):
+        from gurobipy import GRB
+
+        return self.model.addMConstr(sp.csr_matrix(c), self.x, '<', np.array([GRB.INFINITY]))
+
+    def set_bound(self, row, upper):
+        from gurobipy import GRB
+
+        row.RHS = np.array([min(upper, GRB.INFINITY)])
+
+    def change_rhs(self, block, rhs):
+        self.constrs[block].RHS = rhs
+
+    def change_coefficients(self, block, rows, cols, values):
+        constrs = self.constrs[block].tolist()
+        columns = self.column_list()
+        for row, col, value in zip(rows, cols, values):
+            self.model.chgCoeff(constrs[row], columns[col], value)
+
+    def change_bounds(self, lb, ub):
+        self.x.LB = lb
+        self.x.UB = ub
+
+    def set_start(self, x):
+        if self.is_mip:
+            self.last_x = np.asarray(x, dtype=float)
+            return
+        # simplex start from the point, on the presolved model
+        self.x.PStart = x
+        self.model.Params.LPWarmStart = 2
+
+    def optimize(self):
+        from gurobipy import GRB
+
+        if self.last_x is not None and self.model.IsMIP:
+            self.x.Start = self.last_x  # LPs restart from the retained basis instead
+        self.model.optimize()
+        status = self.model.Status
+        if status == GRB.OPTIMAL:
+            self.last_x = self.x.X
+            return 'optimal', self.model.ObjVal
+        if status == GRB.TIME_LIMIT and self.model.SolCount:
+            # the incumbent is feasible, not proven optimal
+            self.last_x = self.x.X
+            return 'time_limit', self.model.ObjVal
+        return str(status), None
+
+    def values(self):
+        return self.last_x
+
+    def stats(self):
+        m = self.model
+        stats = {'runtime': m.Runtime, 'iterations': int(m.IterCount), 'barrier_iterations': m.BarIterCount,
+                 'cols': m.NumVars, 'rows': m.NumConstrs, 'nonzeros': m.NumNZs,
+                 'general_constraints': m.NumGenConstrs}
+        if m.IsMIP:
+            stats['nodes'] = m.NodeCount
+        return stats
+
+    def presolved_size(self):
+        presolved = self.model.presolve()
+        size = presolved.NumVars, presolved.NumConstrs
+        presolved.dispose()
+        return size
+
+    def duals(self):
+        return np.concatenate([constr.Pi for constr in self.constrs])
+
+
+class HighsBackend(Backend):
+    name = 'highs'
+    # the LP simplex needs a basis, which a start point does not give; a basis
+    # guessed from one costs more iterations than a cold start
+    warm_start = False
+
+    @classmethod
+    def available(cls):
+        try:
+            import highspy  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load_program(self, program):
+        import highspy
+
+        if program.general:
+            raise ValueError('highs backend cannot handle max/min general constraints')
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', bool(self.verbose))
+        if self.threads is not None:
+            h.setOptionValue('threads', self.threads)
+        if self.time_limit is not None:
+            h.setOptionValue('time_limit', float(self.time_limit))
+        A, lower, upper = program.row_bounds()
+        A = A.tocsc()
+        lp = highspy.HighsLp()
+        lp.num_col_ = program.n_cols
+        lp.num_row_ = A.shape[0]
+        lp.col_cost_ = np.zeros(program.n_cols)
+        lp.col_lower_ = program.lb
+        lp.col_upper_ = program.ub
+        lp.row_lower_ = lower
+        lp.row_upper_ = upper
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = A.indptr
+        lp.a_matrix_.index_ = A.indices
+        lp.a_matrix_.value_ = A.data
+        h.passModel(lp)
+        self.highs = h
+        self.n_cols = program.n_cols
+        self.n_rows = A.shape[0]
+        self.senses = [block.sense for block in program.blocks]
+        self.offsets = np.cumsum([0] + [block.A.shape[0] for block in program.blocks])
+
+    def set_objective(self, c):
+        self.highs.changeColsCost(self.n_cols, np.arange(self.n_cols, dtype=np.int32), np.asarray(c, dtype=float))
+
+    def add_bound_row(self, c):
+        idx = np.flatnonzero(c).astype(np.int32)
+        self.highs.addRow(-np.inf, np.inf, len(idx), idx, np.asarray(c)[idx])
+        self.n_rows += 1
+        return self.n_rows - 1
+
+    def set_bound(self, row, upper):
+        self.highs.changeRowBounds(row, -np.inf, upper)
+
+    def change_rhs(self, block, rhs):
+        rhs = np.asarray(rhs, dtype=float)
+        rows = np.arange(self.offsets[block], self.offsets[block + 1], dtype=np.int32)
+        sense = self.senses[block]
+        lower = rhs if sense in '=>' else np.full(len(rhs), -np.inf)
+        upper = rhs if sense in '=<' else np.full(len(rhs), np.inf)
+        self.highs.changeRowsBounds(len(rows), rows, lower, upper)
+
+    def change_coefficients(self, block, rows, cols, values):
+        for row, col, value in zip(rows + self.offsets[block], cols, values):
+            self.highs.changeCoeff(int(row), int(col), float(value))
+
+    def change_bounds(self, lb, ub):
+        self.highs.changeColsBounds(self.n_cols, np.arange(self.n_cols, dtype=np.int32), lb, ub)
+
+    def optimize(self):
+        import highspy
+
+        self.highs.run()
+        status = self.highs.getModelStatus()
+        if status == highspy.HighsModelStatus.kOptimal:
+            return 'optimal', self.highs.getInfo().objective_function_value
+        return self.highs.modelStatusToString(status), None
+
+    def values(self):
+        return np.array(self.highs.getSolution().col_value)
+
+    def stats(self):
+        info = self.highs.getInfo()
+        return {'iterations': info.simplex_iteration_count,
+                'barrier_iterations': info.ipm_iteration_count, 'cols': self.highs.getNumCol(),
+                'rows': self.highs.getNumRow(), 'nonzeros': self.highs.getNumNz()}
+
+    def presolved_size(self):
+        import highspy
+
+        # presolve a copy, presolving the loaded model would drop its solution
+        copy = highspy.Highs()
+        copy.setOptionValue('output_flag', False)
+        copy.passModel(self.highs.getLp())
+        copy.presolve()
+        lp = copy.getPresolvedLp()
+        return lp.num_col_, lp.num_row_
+
+    def duals(self):
+        return np.array(self.highs.getSolution().row_dual)[:self.offsets[-1]]
+
+
+class ScipyBackend(Backend):
+    """HiGHS through scipy.optimize.linprog, for boxes without highspy.
+
+    linprog is stateless: updates are applied to local copies of the blocks
+    and every run starts cold.
+    """
+    name = 'scipy'
+
+    @classmethod
+    def available(cls):
+        try:
+            from scipy.optimize import linprog  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load_program(self, program):
+        if program.general:
+            raise ValueError('scipy backend cannot handle max/min general constraints')
+        self.blocks = [[block.A.tocsr(copy=True), block.sense, np.array(block.rhs, dtype=float)]
+                       for block in program.blocks]
+        self.bound_rows_c = []
+        self.bound_rows_upper = []
+        self.bounds = np.column_stack([program.lb, program.ub])
+
+    def set_objective(self, c):
+        self.c = c
+
+    def add_bound_row(self, c):
+        self.bound_rows_c.append(sp.csr_matrix(c))
+        self.bound_rows_upper.append(np.inf)
+        return len(self.bound_rows_c) - 1
+
+    def set_bound(self, row, upper):
+        self.bound_rows_upper[row] = upper
+
+    def change_rhs(self, block, rhs):
+        self.blocks[block][2] = np.array(rhs, dtype=float)
+
+    def change_coefficients(self, block, rows, cols, values):
+        A = self.blocks[block][0].tolil()
+        A[rows, cols] = values
+        self.blocks[block][0] = A.tocsr()
+
+    def change_bounds(self, lb, ub):
+        self.bounds = np.column_stack([lb, ub])
+
+    def optimize(self):
+        from scipy.optimize import linprog
+
+        options = {'disp': bool(self.verbose)}
+        if self.time_limit is not None:
+            options['time_limit'] = float(self.time_limit)
+        eq = [(A, rhs) for A, sense, rhs in self.blocks if sense == '=']
+        ub = [(A, rhs) for A, sense, rhs in self.blocks if sense == '<']
+        ub += [(-A, -rhs) for A, sense, rhs in self.blocks if sense == '>']
+        ub += [(c, np.array([upper])) for c, upper in zip(self.bound_rows_c, self.bound_rows_upper)
+               if np.isfinite(upper)]
+        A_eq = sp.vstack([A for A, _ in eq], format='csr') if eq else None
+        b_eq = np.concatenate([rhs for _, rhs in eq]) if eq else None
+        A_ub = sp.vstack([A for A, _ in ub], format='csr') if ub else None
+        b_ub = np.concatenate([rhs for _, rhs in ub]) if ub else None
+        result = linprog(self.c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                         bounds=self.bounds, method='highs', options=options)
+        self.result = result
+        if result.status == 0:
+            return 'optimal', result.fun
+        return result.message, None
+
+    def values(self):
+        return self.result.x
+
+    def stats(self):
+        return {'iterations': int(self.result.nit), 'cols': len(self.c),
+                'rows': sum(len(rhs) for _, _, rhs in self.blocks) + len(self.bound_rows_c)}
+
+    def duals(self):
+        # linprog reports the '=' rows apart from the '<' rows, followed by the negated '>' rows
+        parts = {}
+        for marginals, senses in ((self.result.eqlin.marginals, '='), (self.result.ineqlin.marginals, '<>')):
+            start = 0
+            for sense in senses:
+                for k, (_, block_sense, rhs) in enumerate(self.blocks):
+                    if block_sense == sense:
+                        parts[k] = marginals[start:start + len(rhs)] * (-1.0 if sense == '>' else 1.0)
+                        start += len(rhs)
+        return np.concatenate([parts[k] for k in range(len(self.blocks))])
+
+
+BACKENDS = {
+    'gurobi': GurobiBackend,
+    'highs': HighsBackend,
+    'scipy': ScipyBackend,
+}
+
+
+def get_backend(name=None, **options):
+    """Instantiate the named backend, or the first available one."""
+    if name is not None:
+        return BACKENDS[name](**options)
+    for backend in BACKENDS.values():
+        if backend.available():
+            return backend(**options)
+    raise RuntimeError('no LP solver available, install gurobipy, highspy or scipy')
+
+
+def solve(program, backend=None, **options):
+    """Solve ``program`` with ``backend`` (a name, an instance or None for auto)."""
+    if not isinstance(backend, Backend):
+        backend = get_backend(backend, **options)
+    return backend.solve(program)
+
+
+def check_envelopes(profiles, end=48, secondary='storage', params=None, backend='gurobi', rtol=1e-6, **options):
+    """Solve a short horizon with both envelope formulations and compare the optima.
+
+    Returns the objective values of the 'genconstr' and 'lp' solves and
+    raises RuntimeError when they differ by more than ``rtol``. The general
+    constraints need Gurobi; 48 timesteps fit its size-limited license.
+    """
+    from model_builder import build_program
+
+    values = {}
+    for envelope in ('genconstr', 'lp'):
+        program = build_program(profiles, end, params, secondary, envelope=envelope)
+        values[envelope] = solve(program, backend, **options).objective_values
+    for name, value in values['genconstr'].items():
+        if not np.isclose(values['lp'][name], value, rtol=rtol, atol=rtol):
+            raise RuntimeError('%s differs between formulations: genconstr %g, lp %g'
+                               % (name, value, values['lp'][name]))
+    return values
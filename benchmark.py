@@ -0,0 +1,176 @@
+"""Benchmark suite of the energy_system model over horizons and formulations.
+
+Every case builds and solves the model once, in a fresh process so the
+peak memory is its own, and records the build time, the solver time
+(load plus every objective), the peak RSS and the primary optimum:
+
+- horizons: one day, one week, the 16-week window of minimize_reject.py
+  and the full 35121-step year;
+- envelope formulation: Gurobi max/min general constraints ('genconstr')
+  or epigraph rows ('lp'), with the storage envelope as secondary
+  objective;
+- objectives: ext_feeder alone ('single') or the lexicographic pair
+  ('multi').
+
+Cases a backend cannot solve (general constraints outside Gurobi) are
+reported as skipped, solver errors as failed; the suite goes on either
+way. The backend is picked once for all cases. The profils files are
+used when present, synthetic profiles otherwise. Results are compared
+with a stored baseline: a case regresses when a time or the memory grows
+by more than ``tolerance`` times, or the primary optimum changes.
+
+    python benchmark.py --horizons day week --save-baseline
+    python benchmark.py --horizons day week   # exits 1 on regressions
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import get_backend
+from model_builder import build_program
+from profile_store import PROFILE_FILES, data_folder, load_profiles
+from profiling import Profiler, peak_rss_mb
+from synthetic import synthetic_profiles
+
+HORIZONS = {
+    'day': 96,
+    'week': 96 * 7,
+    'window': 96 * 7 * 4 * 4,
+    'year': 35121,
+}
+ENVELOPES = ['genconstr', 'lp']
+OBJECTIVES = ['single', 'multi']
+baseline_path = 'benchmark_baseline.json'
+
+
+def has_profiles(folder=data_folder):
+    return all(os.path.exists(os.path.join(folder, name)) for name in PROFILE_FILES.values())
+
+
+def benchmark_profiles(end, folder=data_folder):
+    """The profils series when available, seeded synthetic ones otherwise."""
+    if has_profiles(folder):
+        return load_profiles(folder, end), 'profils'
+    return synthetic_profiles(end), 'synthetic'
+
+
+def case_name(horizon, envelope, objectives):
+    return '%s/%s/%s' % (horizon, envelope, objectives)
+
+
+def run_case(horizon, envelope, objectives, backend=None, folder=data_folder):
+    """Build and solve one case and return its result row."""
+    end = HORIZONS[horizon]
+    row = {'case': case_name(horizon, envelope, objectives), 'horizon': horizon, 'end': end,
+           'envelope': envelope, 'objectives': objectives}
+    profiles, row['profiles'] = benchmark_profiles(end, folder)
+    solver = get_backend(backend)
+    row['backend'] = solver.name
+    with Profiler(row['case']) as profiler:
+        program = build_program(profiles, end, secondary='storage', envelope=envelope)
+        if objectives == 'single':
+            program.objectives = program.objectives[:1]
+        try:
+            solution = solver.solve(program)
+        except ValueError as error:
+            row['status'] = 'skipped: %s' % error
+            return row
+        except Exception as error:
+            # solver errors (RuntimeError, GurobiError...) fail this case, not the suite
+            row['status'] = 'failed: %s' % error
+            return row
+    phases = profiler.phases
+    row['status'] = solution.status
+    row['build_seconds'] = phases['build']['seconds']
+    row['solve_seconds'] = sum(entry['seconds'] for name, entry in phases.items()
+                               if name == 'load' or name.startswith('optimize/'))
+    row['peak_rss_mb'] = peak_rss_mb()
+    row['rows'] = program.n_rows
+    row['cols'] = program.n_cols
+    row.update(solution.objective_values)
+    # the primary value of a multi case may end anywhere within rel_tol, its optimum is unique
+    row['Ext_feeder_optimum'] = solution.stats['Ext_feeder']['optimum']
+    return row
+
+
+def run_suite(horizons=('day', 'week'), envelopes=ENVELOPES, objectives=OBJECTIVES, backend=None,
+              folder=data_folder):
+    """Run every combination, each case in its own process."""
+    # one backend for the whole suite, picked once (see Backend.available)
+    backend = backend or get_backend().name
+    rows = []
+    for horizon in horizons:
+        for envelope in envelopes:
+            for objective in objectives:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    try:
+                        rows.append(pool.submit(run_case, horizon, envelope, objective, backend, folder).result())
+                    except Exception as error:  # the case process died
+                        rows.append({'case': case_name(horizon, envelope, objective), 'horizon': horizon,
+                                     'envelope': envelope, 'objectives': objective, 'backend': backend,
+                                     'status': 'failed: %s' % error})
+    return rows
+
+
+def compare(rows, baseline, tolerance=1.5, min_seconds=0.05, rtol=1e-6):
+    """Regressions of ``rows`` against ``baseline`` rows, as readable strings."""
+    reference = {row['case']: row for row in baseline}
+    findings = []
+    for row in rows:
+        old = reference.get(row['case'])
+        if old is None or not row['status'] == old.get('status') == 'optimal':
+            continue
+        for key in ('build_seconds', 'solve_seconds'):
+            if row[key] > tolerance * old[key] and row[key] - old[key] > min_seconds:
+                findings.append('%s: %s %.3f s (baseline %.3f s)' % (row['case'], key, row[key], old[key]))
+        if row['peak_rss_mb'] > tolerance * old['peak_rss_mb']:
+            findings.append('%s: peak_rss_mb %.0f (baseline %.0f)' % (row['case'], row['peak_rss_mb'],
+                                                                     old['peak_rss_mb']))
+        # optima are only comparable on the same data
+        if row['profiles'] != old['profiles']:
+            continue
+        # older baselines hold the optimum as Ext_feeder
+        value, old_value = row['Ext_feeder_optimum'], old.get('Ext_feeder_optimum', old['Ext_feeder'])
+        if abs(value - old_value) > rtol * max(1.0, abs(old_value)):
+            findings.append('%s: Ext_feeder optimum %.6g (baseline %.6g)' % (row['case'], value, old_value))
+    return findings
+
+
+def format_table(rows):
+    lines = ['%-28s %-8s %10s %10s %9s  %s' % ('case', 'backend', 'build [s]', 'solve [s]', 'rss [MB]', 'status')]
+    for row in rows:
+        lines.append('%-28s %-8s %10.3f %10.3f %9.0f  %s' % (
+            row['case'], row['backend'], row.get('build_seconds', float('nan')),
+            row.get('solve_seconds', float('nan')), row.get('peak_rss_mb', float('nan')), row['status']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--horizons', nargs='+', default=['day', 'week'], choices=list(HORIZONS))
+    parser.add_argument('--envelopes', nargs='+', default=ENVELOPES, choices=ENVELOPES)
+    parser.add_argument('--objectives', nargs='+', default=OBJECTIVES, choices=OBJECTIVES)
+    parser.add_argument('--backend')
+    parser.add_argument('--folder', default=data_folder)
+    parser.add_argument('--baseline', default=baseline_path)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    parser.add_argument('--output', help='JSON file for the result rows')
+    args = parser.parse_args()
+
+    rows = run_suite(args.horizons, args.envelopes, args.objectives, args.backend, args.folder)
+    print(format_table(rows))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(rows, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(rows, file, indent=1)
+        print('baseline written to %s' % args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            findings = compare(rows, json.load(file), args.tolerance)
+        print('\n'.join(findings) if findings else 'no regression against %s' % args.baseline)
+        if findings:
+            raise SystemExit(1)
@@ -0,0 +1,111 @@
+"""Coarse-to-fine solve (experimental): an hourly or daily solve warm-starts the quarter-hour model.
+
+The profiles are averaged over blocks of ``step`` timesteps (4 for hourly,
+96 for daily) and the model is solved on the blocks, each weighted by its
+length as in adaptive_resolution. Expanded back to the quarter-hours, that
+solution carries the gas storage trajectory and the mv/mp import levels
+of the year; it is the start point of the fine solve (PStart of a Gurobi
+LP, MIP start with general constraints). Backends that ignore start points
+(HiGHS, scipy) are refused unless storage targets are set, since the
+coarse solve would only add its cost. Optionally the fine storage level
+is kept within ``band`` of the coarse trajectory every ``target_every``
+timesteps, which decouples the periods further at the price of exactness:
+the fine optimum is then only that of the restricted trajectory.
+
+The mode is experimental: fewer iterations than a cold start have only
+been seen on models within the size-limited Gurobi license, never on
+full-size ones; check with ``--compare`` before relying on it.
+
+    python coarse_to_fine.py --end 35121 --step 4 --compare
+"""
+import argparse
+import time
+
+import numpy as np
+
+from adaptive_resolution import expand, segment_means
+from backends import get_backend
+from model_builder import build_program
+from profile_store import data_folder, load_profiles
+
+hour = 4
+day = 96
+
+
+def block_lengths(end, step):
+    """Lengths of the blocks of ``step`` timesteps covering ``[0, end)``, the last one shorter."""
+    lengths = np.full(end // step, step)
+    return np.append(lengths, end % step) if end % step else lengths
+
+
+def coarse_solve(profiles, end=None, step=hour, params=None, secondary='storage', backend=None, **options):
+    """Solution on blocks of ``step`` timesteps, expanded to the original timesteps."""
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    lengths = block_lengths(end, step)
+    program = build_program(segment_means(profiles, lengths), len(lengths), params, secondary, weights=lengths)
+    return expand(get_backend(backend, **options).solve(program), lengths)
+
+
+def storage_targets(program, cum_sum, every, band):
+    """Keep the cum_sum level within ``band`` times the coarse range of ``cum_sum`` every ``every`` timesteps."""
+    t = np.arange(every, program.layout.end + 1, every) - 1
+    width = band * (cum_sum.max() - cum_sum.min())
+    cols = program.layout.cum_sum.start + t
+    program.lb[cols] = np.maximum(program.lb[cols], cum_sum[t] - width)
+    program.ub[cols] = np.minimum(program.ub[cols], cum_sum[t] + width)
+    return program
+
+
+def coarse_to_fine_solve(profiles, end=None, step=hour, params=None, secondary='storage', target_every=None,
+                         band=0.25, backend=None, **options):
+    """Solve the model of ``profiles`` started from the solution on ``step`` blocks (experimental).
+
+    The returned Solution also has ``coarse``, the expanded coarse
+    solution, and ``coarse_runtime``.
+    """
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    solver = get_backend(backend, **options)
+    if not solver.warm_start and not target_every:
+        raise ValueError('%s ignores start points, the coarse solve would only add its cost' % solver.name)
+    start = time.perf_counter()
+    coarse = coarse_solve(profiles, end, step, params, secondary, backend, **options)
+    coarse_runtime = time.perf_counter() - start
+    program = build_program(profiles, end, params, secondary)
+    if target_every:
+        storage_targets(program, coarse.cum_sum, target_every, band)
+    solver.load(program)
+    solver.set_start(program.layout.restrict(coarse.x))
+    solution = solver.run(program)
+    solution.coarse = coarse
+    solution.coarse_runtime = coarse_runtime
+    solution.runtime = time.perf_counter() - start
+    return solution
+
+
+def iterations(solution):
+    return sum(stats.get('iterations', 0) + stats.get('barrier_iterations', 0)
+               for stats in solution.stats.values() if isinstance(stats, dict))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--end', type=int, default=35121)
+    parser.add_argument('--step', type=int, default=hour, help='coarse block length in timesteps')
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--target-every', type=int, help='storage target spacing in timesteps')
+    parser.add_argument('--band', type=float, default=0.25)
+    parser.add_argument('--backend')
+    parser.add_argument('--folder', default=data_folder)
+    parser.add_argument('--compare', action='store_true', help='also solve the model cold')
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.folder, args.end)
+    solution = coarse_to_fine_solve(profiles, args.end, args.step, secondary=args.secondary,
+                                    target_every=args.target_every, band=args.band, backend=args.backend)
+    print('warm', solution.objective_values, '%.2f s (coarse %.2f s), %d iterations'
+          % (solution.runtime, solution.coarse_runtime, iterations(solution)))
+    if args.compare:
+        cold = get_backend(args.backend).solve(build_program(profiles, args.end, secondary=args.secondary))
+        print('cold', cold.objective_values, '%.2f s, %d iterations' % (cold.runtime, iterations(cold)))
@@ -0,0 +1,24 @@
+"""Fixtures of the tests: seeded synthetic profiles and the LP backends that run here."""
+import pytest
+
+from backends import BACKENDS
+from synthetic import synthetic_profiles
+
+LP_BACKENDS = [name for name in ('highs', 'scipy') if BACKENDS[name].available()]
+
+
+@pytest.fixture(scope='session')
+def end():
+    """Horizon of the tests, small enough for the size-limited Gurobi license."""
+    return 48
+
+
+@pytest.fixture(scope='session')
+def profiles(end):
+    return synthetic_profiles(end)
+
+
+@pytest.fixture(params=LP_BACKENDS)
+def backend(request):
+    """Name of every LP backend available, HiGHS through highspy or scipy."""
+    return request.param
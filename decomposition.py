@@ -0,0 +1,430 @@
+"""Benders decomposition of the energy_system model by period.
+
+Apart from the gas storage, every constraint of the model (hubs, COPs,
+CHP, P2G, demands) only links flows of the same quarter-hour. Fixing the
+storage level at the boundaries between periods (weeks by default) splits
+the ext_feeder problem into independent period subproblems, solved in
+parallel worker processes. A small master LP chooses the boundary levels:
+each subproblem returns its optimum and, from the duals of its cum_sum and
+storage rows, a cut on how that optimum changes with its initial and final
+levels. The largest net charge and discharge of every period bound the
+level changes, so each trajectory the master proposes is feasible.
+
+The primary optimum leaves the boundary levels largely free, so a second
+stage chooses them for the secondary objective, with the primary total
+bounded by its optimum plus ``rel_tol`` like the monolithic hierarchy. Its
+master also holds a primary budget per period (the budgets sum to the
+bound), a secondary cost per period and, for the envelope terms of the
+storage level, the envelope levels; each period keeps its storage level
+within those bands. A subproblem returns its primary optimum within the
+bands (a cut keeping the budget above it) and, when the budget allows it,
+the optimum of the secondary totals within the budget (a cut on the
+secondary cost). Once the bounds meet, the periods are solved at the final
+levels, bands and budgets, minimizing the secondary then the primary
+objective, and stitched like rolling_horizon. As in the monolithic
+hierarchy, the primary total may end anywhere within its bound.
+
+Secondary objectives with an envelope the master cannot hold as a band
+(one of a link flow, or one the objective pushes outwards like mv_min)
+skip the second stage: the periods are then solved at the primary levels
+with the whole hierarchy, so that objective only acts within each period
+and is not optimal over the horizon.
+
+    python decomposition.py --end 35121 --workers 8
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from backends import get_backend
+from model_builder import DEFAULT_PARAMS, ConstraintBlock, Layout, Objective, build_program, default_topology
+from profile_store import data_folder, load_profiles
+from rolling_horizon import stitched_solution, week, worst_status
+from topology import coefficient
+
+
+def primary_only(program):
+    """Keep the first objective only; the envelope terms it does not use are dropped."""
+    program.blocks = [block for block in program.blocks if not block.name.startswith('envelope_')]
+    program.general = []
+    program.objectives = program.objectives[:1]
+    return program
+
+
+def secondary_parts(topology, secondary):
+    """Split the secondary objective into its totals and its envelope terms of the storage level.
+
+    Returns ``(totals, envelopes)`` as ``name -> coefficient`` and
+    ``name -> (kind, coefficient)``, or None when an envelope term cannot be
+    held as a band (an envelope of a link, or a max the objective
+    maximizes, a min it minimizes).
+    """
+    totals, envelopes = {}, {}
+    for name, coef in topology.secondary[secondary].items():
+        if name not in topology.envelopes:
+            totals[name] = coef
+            continue
+        kind, of = topology.envelopes[name]
+        if of != 'cum_sum' or (kind == 'max') != (coef > 0):
+            return None
+        envelopes[name] = (kind, coef)
+    return totals, envelopes
+
+
+def band_program(profiles, params, initial, final, bands=None):
+    """Primary program of one period whose storage level stays within ``bands``.
+
+    ``bands`` maps envelope terms of the storage level to a level: below it
+    for a 'max' term, above it for a 'min' one.
+    """
+    end = len(next(iter(profiles.values())))
+    program = primary_only(build_program(profiles, end, params, initial_storage=initial, final_storage=final))
+    layout = program.layout
+    cols = np.arange(layout.cum_sum.start, layout.cum_sum.stop)
+    for name, level in (bands or {}).items():
+        kind = layout.topology.envelopes[name][0]
+        A = sp.csr_matrix((np.ones(end), (np.arange(end), cols)), shape=(end, program.n_cols))
+        program.blocks.append(ConstraintBlock('band_' + name, A, '<' if kind == 'max' else '>', np.full(end, level)))
+    return program
+
+
+def budget_block(program, budget):
+    """Row keeping the primary objective of ``program`` within ``budget``."""
+    return ConstraintBlock('budget', sp.csr_matrix(program.objectives[0].c), '<', np.array([budget]))
+
+
+def derivatives(program, duals, bands=None):
+    """Derivatives of the optimum by the initial and final levels and by every band level."""
+    # rhs of the first cum_sum row is the initial level, the storage row holds final - initial
+    dynamics = duals[program.row_offset('cum_sum')]
+    net = duals[program.row_offset(program.layout.topology.storage[0])]
+    result = {'initial': dynamics - net, 'final': net}
+    for name in bands or {}:
+        start = program.row_offset('band_' + name)
+        result[name] = float(duals[start:start + program.block('band_' + name).A.shape[0]].sum())
+    return result
+
+
+def _period_capacity(task):
+    """Largest net decrease and increase of the storage level over one period (inf when unbounded)."""
+    profiles, params, backend, options = task
+    end = len(next(iter(profiles.values())))
+    program = primary_only(build_program(profiles, end, params, final_storage=None))
+    layout = program.layout
+    program.lb[layout.cum_sum] = -np.inf
+    storage = layout.link(*layout.topology.storage)
+    capacity = []
+    for sign in (1.0, -1.0):
+        c = np.zeros(program.n_cols)
+        c[storage] = sign * layout.weight()
+        program.objectives = [Objective('capacity', c, 1)]
+        try:
+            solution = get_backend(backend, **options).solve(program)
+        except RuntimeError:
+            capacity.append(np.inf)
+            continue
+        capacity.append(-solution.objective_values['capacity'])
+    return capacity
+
+
+def _period_cut(task):
+    """Primary optimum of one period and its derivatives by the initial and final levels."""
+    profiles, params, initial, final, backend, options = task
+    program = band_program(profiles, params, initial, final)
+    solver = get_backend(backend, **options)
+    solution = solver.solve(program)
+    d = derivatives(program, solver.duals())
+    return solution.objective_values[program.objectives[0].name], d['initial'], d['final']
+
+
+def _period_secondary(task):
+    """Second stage subproblem of one period at given levels, bands and primary budget.
+
+    Returns the primary optimum within the bands with its derivatives;
+    unless that optimum exceeds the budget, the optimum of the secondary
+    totals within the budget with its derivatives and the one by the
+    budget (None otherwise); and the budget used, at least the optimum.
+    """
+    profiles, params, totals, initial, final, bands, budget, backend, options, tol = task
+    program = band_program(profiles, params, initial, final, bands)
+    solver = get_backend(backend, **options)
+    primary = solver.solve(program).objective_values[program.objectives[0].name]
+    primary_cut = primary, derivatives(program, solver.duals(), bands)
+    if primary > budget + tol * max(1.0, abs(budget)):
+        return primary_cut, None, budget
+    budget = max(budget, primary)
+    c = program.scalar_objective(totals)
+    if not c.any():
+        return primary_cut, (0.0, dict.fromkeys(primary_cut[1], 0.0), 0.0), budget
+    program.blocks.append(budget_block(program, budget))
+    program.objectives = [Objective('secondary', c, 1)]
+    value = solver.solve(program).objective_values['secondary']
+    duals = solver.duals()
+    return primary_cut, (value, derivatives(program, duals, bands), float(duals[-1])), budget
+
+
+def _period_solve(task):
+    """Final solve of one period: the whole hierarchy, or the plan ``(totals, bands, budget)`` of the second stage."""
+    profiles, params, secondary, initial, final, plan, backend, options = task
+    end = len(next(iter(profiles.values())))
+    if plan is None:
+        program = build_program(profiles, end, params, secondary, initial_storage=initial, final_storage=final)
+    else:
+        totals, bands, budget = plan
+        program = band_program(profiles, params, initial, final, bands)
+        primary = program.objectives[0]
+        program.blocks.append(budget_block(program, budget))
+        program.objectives = [Objective(secondary, program.scalar_objective(totals), 2),
+                              Objective(primary.name, primary.c, 1)]
+    solution = get_backend(backend, **options).solve(program)
+    return solution.x, solution.backend, solution.status
+
+
+def converged(lower, upper, tol):
+    """Whether the Benders bounds are within ``tol`` (relative to the upper one)."""
+    return upper - lower <= tol * max(1.0, abs(upper))
+
+
+class Master:
+    """Benders master LP: boundary levels ``s[0..n]`` and period costs ``theta[0..n-1]``."""
+
+    def __init__(self, n_periods, initial, final, decrease, increase, max_level=None):
+        self.n = n_periods
+        self.c, self.lb, self.ub = np.zeros(0), np.zeros(0), np.zeros(0)
+        self.rows, self.rhs = [], []
+        inner = np.inf if max_level is None else max_level
+        self.levels = self.add_columns(0.0, np.concatenate([[initial], np.zeros(n_periods - 1), [final]]),
+                                       np.concatenate([[initial], np.full(n_periods - 1, inner), [final]]))
+        self.theta = self.add_columns(1.0, np.full(n_periods, -np.inf), np.full(n_periods, np.inf))
+        # s[k] - s[k + 1] <= decrease[k] and s[k + 1] - s[k] <= increase[k]
+        for k in range(n_periods):
+            for sign, capacity in ((1.0, decrease[k]), (-1.0, increase[k])):
+                if np.isfinite(capacity):
+                    self.add_row({k: sign, k + 1: -sign}, capacity)
+
+    def add_columns(self, cost, lb, ub):
+        """Append columns of objective coefficient ``cost`` and return their slice."""
+        start = len(self.c)
+        self.c = np.append(self.c, np.full(len(lb), cost))
+        self.lb = np.append(self.lb, lb)
+        self.ub = np.append(self.ub, ub)
+        return slice(start, len(self.c))
+
+    def add_row(self, coefs, rhs):
+        """``sum(coef * x[col]) <= rhs`` over the ``col: coef`` items of ``coefs``."""
+        self.rows.append(coefs)
+        self.rhs.append(rhs)
+
+    def add_cut(self, column, value, gradient, point):
+        """``x[column] >= value + sum(gradient[col] * (x[col] - point[col]))``."""
+        coefs = dict(gradient)
+        coefs[column] = coefs.get(column, 0.0) - 1.0
+        self.add_row(coefs, sum(coef * point[col] for col, coef in gradient.items()) - value)
+
+    def add_period_cut(self, k, value, levels, d_initial, d_final):
+        """``theta[k] >= value + d_initial (s[k] - levels[k]) + d_final (s[k + 1] - levels[k + 1])``."""
+        self.add_cut(self.theta.start + k, value, {k: d_initial, k + 1: d_final},
+                     {k: levels[k], k + 1: levels[k + 1]})
+
+    def optimize(self):
+        from scipy.optimize import linprog
+
+        rows = [k for k, coefs in enumerate(self.rows) for _ in coefs]
+        cols = [col for coefs in self.rows for col in coefs]
+        data = [coef for coefs in self.rows for coef in coefs.values()]
+        A = sp.csr_matrix((data, (rows, cols)), shape=(len(self.rows), len(self.c)))
+        result = linprog(self.c, A_ub=A, b_ub=np.array(self.rhs), bounds=np.column_stack([self.lb, self.ub]),
+                         method='highs')
+        if result.status != 0:
+            raise RuntimeError('decomposition master: %s' % result.message)
+        return result
+
+    def solve(self):
+        result = self.optimize()
+        return result.fun, result.x[self.levels]
+
+
+class SecondaryMaster(Master):
+    """Second stage master: boundary levels, primary budgets ``theta`` summing to at most ``budget``,
+    period costs ``eta`` of the secondary totals and one band level per envelope term."""
+
+    def __init__(self, n_periods, initial, final, decrease, increase, budget, envelopes, max_level=None):
+        super().__init__(n_periods, initial, final, decrease, increase, max_level)
+        self.c[self.theta] = 0.0
+        self.add_row(dict.fromkeys(range(self.theta.start, self.theta.stop), 1.0), budget)
+        self.eta = self.add_columns(1.0, np.full(n_periods, -np.inf), np.full(n_periods, np.inf))
+        self.bands = {}
+        for name, (kind, coef) in envelopes.items():
+            col = self.bands[name] = self.add_columns(coef, [-np.inf], [np.inf]).start
+            # the band holds every boundary level, which keeps each period feasible
+            sign = 1.0 if kind == 'max' else -1.0
+            for k in range(n_periods + 1):
+                self.add_row({k: sign, col: -sign}, 0.0)
+
+    def add_secondary_cuts(self, k, x, primary_cut, secondary_cut):
+        """Cuts of period ``k`` evaluated at the master point ``x`` (see _period_secondary)."""
+        def gradient(d):
+            result = {k: d['initial'], k + 1: d['final']}
+            result.update((self.bands[name], d[name]) for name in self.bands if name in d)
+            return result
+
+        budget = self.theta.start + k
+        value, d = primary_cut
+        self.add_cut(budget, value, gradient(d), x)
+        if secondary_cut is not None:
+            value, d, d_budget = secondary_cut
+            secondary_gradient = gradient(d)
+            secondary_gradient[budget] = d_budget
+            self.add_cut(self.eta.start + k, value, secondary_gradient, x)
+
+    def solve(self):
+        result = self.optimize()
+        return result.fun, result.x
+
+
+def secondary_stage(pool, parts, params, secondary, capacity, cuts, values, levels, backend=None, options=None,
+                    tol=1e-6, max_iterations=50, max_level=None):
+    """Second stage: boundary levels, bands and budgets minimizing the secondary objective.
+
+    ``cuts`` are the ``(k, value, levels, d_initial, d_final)`` primary cuts
+    of the first stage and ``values`` the primary optimum of every period at
+    its best ``levels``. Returns the levels, the ``(totals, bands, budget)``
+    plan of every period and the (lower, upper) bounds of every iteration,
+    or None when the secondary objective cannot be decomposed.
+    """
+    parts_of_secondary = secondary_parts(default_topology, secondary)
+    if parts_of_secondary is None:
+        return None
+    totals, envelopes = parts_of_secondary
+    n = len(parts)
+    primary = default_topology.primary
+    best_upper = sum(values)
+    budget = best_upper + coefficient(primary.get('rel_tol', 0.0), params) * abs(best_upper)
+    master = SecondaryMaster(n, 0.0, 0.0, [c[0] for c in capacity], [c[1] for c in capacity], budget, envelopes,
+                             max_level)
+    for k, value, cut_levels, d_initial, d_final in cuts:
+        master.add_period_cut(k, value, cut_levels, d_initial, d_final)
+
+    # start from the first stage levels, no bands and the slack of the bound shared out
+    x = np.zeros(len(master.c))
+    x[master.levels] = levels
+    x[master.theta] = np.asarray(values) + (budget - best_upper) / n
+    bands = None
+    best = np.inf, None, None
+    bounds = []
+    for _ in range(max_iterations):
+        results = list(pool.map(_period_secondary, [
+            (part, params, totals, x[k], x[k + 1], bands, x[master.theta.start + k], backend, options, tol)
+            for k, part in enumerate(parts)]))
+        for k, (primary_cut, secondary_cut, _) in enumerate(results):
+            master.add_secondary_cuts(k, x, primary_cut, secondary_cut)
+        if bands is not None and all(secondary_cut is not None for _, secondary_cut, _ in results):
+            upper = (sum(secondary_cut[0] for _, secondary_cut, _ in results)
+                     + sum(coef * bands[name] for name, (_, coef) in envelopes.items()))
+            if upper < best[0]:
+                best = upper, x[master.levels].copy(), [(totals, bands, used) for _, _, used in results]
+        lower, x = master.solve()
+        bands = {name: x[col] for name, col in master.bands.items()}
+        bounds.append((lower, best[0]))
+        if best[1] is not None and converged(lower, best[0], tol):
+            break
+    if best[1] is None:
+        raise RuntimeError('decomposition: no feasible second stage point in %d iterations' % max_iterations)
+    return best[1], best[2], bounds
+
+
+def decomposed_solve(profiles, end=None, period=week, params=None, secondary='storage', workers=None,
+                     threads=1, backend=None, tol=1e-6, max_iterations=50, max_level=None, **options):
+    """Solve ``profiles[:end]`` by Benders decomposition over periods of ``period`` timesteps.
+
+    Returns a backends.Solution over the full horizon like rolling_solve;
+    ``solution.levels`` holds the storage level at each period boundary,
+    ``solution.bounds`` the (lower, upper) primary bounds of every
+    iteration and ``solution.secondary_bounds`` those of the second stage
+    (None when it is skipped). ``max_level`` caps the boundary levels when
+    a period can charge the storage without limit. The status is
+    'iteration_limit' when the bounds of a stage are still more than
+    ``tol`` apart after ``max_iterations``, otherwise the worst status of
+    the period solves.
+    """
+    start_time = time.perf_counter()
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    options = dict(options, threads=threads)
+    periods = [(start, min(start + period, end)) for start in range(0, end, period)]
+    parts = [{name: np.array(series[start:stop], dtype=float) for name, series in profiles.items()}
+             for start, stop in periods]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        capacity = list(pool.map(_period_capacity, [(part, params, backend, options) for part in parts]))
+        master = Master(len(periods), 0.0, 0.0, [c[0] for c in capacity], [c[1] for c in capacity], max_level)
+        levels = np.zeros(len(periods) + 1)  # no storage use is always feasible
+        best_upper, best_levels, best_values = np.inf, levels, None
+        bounds = []
+        history = []
+        for _ in range(max_iterations):
+            cuts = list(pool.map(_period_cut, [(part, params, levels[k], levels[k + 1], backend, options)
+                                               for k, part in enumerate(parts)]))
+            upper = sum(value for value, _, _ in cuts)
+            if upper < best_upper:
+                best_upper, best_levels, best_values = upper, levels, [value for value, _, _ in cuts]
+            for k, (value, d_initial, d_final) in enumerate(cuts):
+                master.add_period_cut(k, value, levels, d_initial, d_final)
+                history.append((k, value, levels, d_initial, d_final))
+            lower, levels = master.solve()
+            bounds.append((lower, best_upper))
+            if converged(lower, best_upper, tol):
+                break
+
+        stage = secondary_stage(pool, parts, params, secondary, capacity, history, best_values, best_levels,
+                                backend, options, tol, max_iterations, max_level)
+        if stage is None:
+            plans, secondary_bounds = [None] * len(parts), None
+        else:
+            best_levels, plans, secondary_bounds = stage
+        results = list(pool.map(_period_solve, [(part, params, secondary, best_levels[k], best_levels[k + 1],
+                                                 plans[k], backend, options) for k, part in enumerate(parts)]))
+
+    layout = Layout(end)
+    x = np.zeros(layout.n_cols)
+    flows = x[:len(layout.links) * end].reshape(len(layout.links), end)
+    cum_sum = x[layout.cum_sum]
+    for (start, stop), (part_x, name, _) in zip(periods, results):
+        flows[:, start:stop] = part_x[:len(layout.links) * (stop - start)].reshape(len(layout.links), -1)
+        cum_sum[start:stop] = part_x[len(layout.links) * (stop - start):][:stop - start]
+    # bounds still apart after max_iterations leave the levels suboptimal
+    statuses = [status for _, _, status in results]
+    stages = [bounds] + ([secondary_bounds] if secondary_bounds else [])
+    if not all(converged(*stage_bounds[-1], tol) for stage_bounds in stages):
+        statuses.append('iteration_limit')
+    solution = stitched_solution(layout, x, params, secondary, time.perf_counter() - start_time, name,
+                                 worst_status(statuses))
+    solution.levels = best_levels
+    solution.bounds = bounds
+    solution.secondary_bounds = secondary_bounds
+    return solution
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--end', type=int, default=35121)
+    parser.add_argument('--period', type=int, default=week)
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--folder', default=data_folder)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threads', type=int, default=1, help='solver threads per worker')
+    parser.add_argument('--backend')
+    args = parser.parse_args()
+    solution = decomposed_solve(load_profiles(args.folder, args.end), args.end, args.period,
+                                secondary=args.secondary, workers=args.workers, threads=args.threads,
+                                backend=args.backend)
+    print(solution.objective_values)
+    print('%d periods, %d iterations, bounds %s, %.1f s'
+          % (len(solution.levels) - 1, len(solution.bounds), solution.bounds[-1], solution.runtime))
+    if solution.secondary_bounds:
+        print('second stage: %d iterations, bounds %s'
+              % (len(solution.secondary_bounds), solution.secondary_bounds[-1]))
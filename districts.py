@@ -0,0 +1,179 @@
+"""Multi-district energy_system model on a shared mv feeder and gas backbone.
+
+Every district gets its own copy of the topology.json network: hubs,
+links, equations and profiles are renamed 'node@district' and its profiles
+'profile@district'. The districts only meet on the backbone hubs, 'mv' and
+'gas': each district reaches them through its own hub copy ('mv@d03',
+'gas@d03') and a pair of pipe links whose capacity is the district's
+transfer limit. The backbone holds what is shared: the mv feeder (links
+from and to 'grid', with an optional feeder capacity), the mp gas supply
+and the gas storage. Electricity exported by one district can thus cover
+another one's needs, and ext_feeder charges what the feeder itself imports.
+
+The result is an ordinary Topology, so build_program and the backends work
+unchanged; Results sums its link lists over the district copies.
+
+    python districts.py synthetic_sites --end 672 --transfer-mv 2
+"""
+import argparse
+import os
+import time
+
+from backends import get_backend
+from model_builder import build_program
+from profile_store import load_profiles
+from results import Results
+from topology import Topology, default_path, read_spec
+
+BACKBONE = {
+    # hubs shared by the districts, each district reaching them through its own copy
+    'hubs': ['mv', 'gas'],
+    # nodes of the base network that only exist once, on the backbone
+    'shared': ['mp', 'gas_storage'],
+    # backbone links that do not come from the base network
+    'links': [{'src': 'grid', 'dst': 'mv'}, {'src': 'mv', 'dst': 'grid'}],
+    # base links whose totals and envelopes move to a backbone link
+    'replace': {('mv', 'lv'): ('grid', 'mv'), ('lv', 'mv'): ('mv', 'grid')},
+}
+
+
+def local(name, district):
+    return '%s@%s' % (name, district)
+
+
+def district_names(n):
+    return ['d%02d' % k for k in range(n)]
+
+
+def district_spec(districts, base=None, transfer=None, feeder=None, backbone=BACKBONE):
+    """Topology spec of the base network (topology.json by default) replicated per district.
+
+    ``transfer`` maps each backbone hub to the capacity of the pipes between
+    it and every district (None for unlimited), ``feeder`` caps the mv
+    feeder in both directions.
+    """
+    base = base or read_spec(default_path)
+    transfer = transfer or {}
+    backbone_hubs = list(backbone['hubs'])
+    shared = set(backbone['shared'])
+    replace = backbone['replace']
+
+    def is_shared(link):
+        return link[0] in shared or link[1] in shared
+
+    def district_link(link, district):
+        return link if is_shared(link) else (local(link[0], district), local(link[1], district))
+
+    links = [dict(link) for link in base['links'] if is_shared((link['src'], link['dst']))]
+    links += [dict(link, ub=feeder) for link in backbone['links']]
+    hubs = list(backbone_hubs)
+    equations, profiles = [], {}
+    district_hubs = list(base['hubs']) + [hub for hub in backbone_hubs if hub not in base['hubs']]
+    for district in districts:
+        hubs += [local(hub, district) for hub in district_hubs]
+        for link in base['links']:
+            if not is_shared((link['src'], link['dst'])):
+                links.append(dict(link, src=local(link['src'], district), dst=local(link['dst'], district)))
+        for hub in backbone_hubs:
+            links.append({'src': hub, 'dst': local(hub, district), 'ub': transfer.get(hub)})
+            links.append({'src': local(hub, district), 'dst': hub, 'ub': transfer.get(hub)})
+        for name, file_name in base.get('profiles', {}).items():
+            profiles[local(name, district)] = file_name
+        for equation in base.get('equations', []):
+            equation = dict(equation, name=local(equation['name'], district),
+                            terms=[[list(district_link(tuple(link), district)), coef]
+                                   for link, coef in equation['terms']])
+            if equation.get('profile') is not None:
+                equation['profile'] = local(equation['profile'], district)
+            equations.append(equation)
+
+    envelopes = {}
+    for name, envelope in base.get('envelopes', {}).items():
+        of = envelope['of']
+        if of != 'cum_sum':
+            of = tuple(of)
+            if of in replace:
+                of = replace[of]
+            elif not is_shared(of):
+                raise ValueError('envelope %r of district link %s -> %s has no backbone counterpart' % ((name,) + of))
+            of = list(of)
+        envelopes[name] = dict(envelope, of=of)
+    totals = {}
+    for name, terms in base.get('totals', {}).items():
+        totals[name] = []
+        for link, coef in terms:
+            link = tuple(link)
+            if link in replace or is_shared(link):
+                totals[name].append([list(replace.get(link, link)), coef])
+            else:
+                totals[name] += [[list(district_link(link, district)), coef] for district in districts]
+
+    return dict(base, name='%s_%d_districts' % (base.get('name', 'energy_system'), len(districts)),
+                profiles=profiles, hubs=hubs, links=links, equations=equations, envelopes=envelopes,
+                totals=totals)
+
+
+def district_topology(districts, transfer=None, feeder=None, path=None):
+    """Compiled Topology of the network of ``path`` over ``districts`` (names or a count)."""
+    if isinstance(districts, int):
+        districts = district_names(districts)
+    return Topology(district_spec(districts, read_spec(path or default_path), transfer, feeder))
+
+
+def district_profiles(profiles, districts):
+    """One profiles dict, with 'name@district' keys, from a list of per-district dicts."""
+    return {local(name, district): series
+            for district, series_by_name in zip(districts, profiles)
+            for name, series in series_by_name.items()}
+
+
+def build_districts(profiles, end=None, params=None, secondary='storage', transfer=None, feeder=None,
+                    districts=None, **options):
+    """Build the model of one district per profiles dict of the ``profiles`` list.
+
+    ``options`` are passed to build_program (envelope, storage levels...).
+    """
+    districts = districts or district_names(len(profiles))
+    topology = district_topology(districts, transfer, feeder)
+    return build_program(district_profiles(profiles, districts), end, params, secondary, topology=topology,
+                         **options)
+
+
+def district_exchanges(solution, districts):
+    """Per district horizon totals of the flows received from and sent to each backbone hub."""
+    results = Results(solution)
+    weight = solution.layout.weight()
+    table = {}
+    for district in districts:
+        row = {}
+        for hub in BACKBONE['hubs']:
+            row[hub + '_in'] = float(results[hub, local(hub, district)] @ weight)
+            row[hub + '_out'] = float(results[local(hub, district), hub] @ weight)
+        table[district] = row
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sites', help='folder of site_* profile stores (see synthetic.py)')
+    parser.add_argument('--end', type=int, default=96 * 7)
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--transfer-mv', type=float)
+    parser.add_argument('--transfer-gas', type=float)
+    parser.add_argument('--feeder', type=float)
+    parser.add_argument('--backend')
+    args = parser.parse_args()
+
+    folders = sorted(os.path.join(args.sites, name) for name in os.listdir(args.sites) if name.startswith('site_'))
+    districts = district_names(len(folders))
+    profiles = [load_profiles(folder, args.end) for folder in folders]
+    start = time.perf_counter()
+    program = build_districts(profiles, args.end, secondary=args.secondary,
+                              transfer={'mv': args.transfer_mv, 'gas': args.transfer_gas}, feeder=args.feeder,
+                              envelope='lp' if args.backend in ('highs', 'scipy') else 'auto')
+    print('%d districts, %d columns, %d rows built in %.2f s'
+          % (len(districts), program.n_cols, program.n_rows, time.perf_counter() - start))
+    solution = get_backend(args.backend).solve(program)
+    print(solution.objective_values, '%.2f s' % solution.runtime)
+    for district, row in district_exchanges(solution, districts).items():
+        print(district, ' '.join('%s %.1f' % item for item in row.items()))
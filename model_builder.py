@@ -0,0 +1,401 @@
+"""Vectorized builder for the energy_system model.
+
+Every link is a block of ``end`` consecutive columns of one matrix variable,
+and every hub balance, COP, demand and conversion constraint is emitted as a
+single sparse row block ``A @ x (sense) b`` instead of a per-timestep
+generator over ``tupledict.sum`` wildcard lookups. The network itself (links,
+hubs, equations, totals and objectives) comes from topology.json, see
+topology.py.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from profiling import phase
+from topology import coefficient, load_topology
+
+default_topology = load_topology()
+
+# parameters of topology.json
+DEFAULT_PARAMS = default_topology.params
+
+# secondary objective of the lexicographic hierarchy, ext_feeder being the first
+SECONDARY_OBJECTIVES = default_topology.secondary
+
+
+class Layout:
+    """Column offsets of the link blocks, the cumulative storage and the scalars.
+
+    ``weights`` is the number of original timesteps each modelled timestep
+    stands for (None when every timestep is a single quarter-hour).
+    ``fixed`` maps topology link numbers to the flows the presolve fixed;
+    those links get no columns and ``expand`` puts them back into a
+    solution vector of the ``full`` layout.
+    """
+
+    def __init__(self, end, topology=None, weights=None, fixed=None):
+        self.end = end
+        self.topology = topology or default_topology
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.fixed = dict(fixed or {})
+        # column block of every topology link number, -1 for the fixed links
+        self.positions = np.arange(len(self.topology.links), dtype=np.int64)
+        if self.fixed:
+            free = np.ones(len(self.positions), dtype=bool)
+            free[list(self.fixed)] = False
+            self.positions = np.where(free, np.cumsum(free) - 1, -1)
+            self.links = [link for link, keep in zip(self.topology.links, free) if keep]
+            self.link_index = {link: k for k, link in enumerate(self.links)}
+        else:
+            self.links = list(self.topology.links)
+            self.link_index = self.topology.link_index
+        n_link_cols = len(self.links) * end
+        self.cum_sum = slice(n_link_cols, n_link_cols + end)
+        self.scalars = {name: n_link_cols + end + k for k, name in enumerate(self.topology.scalars)}
+        self.n_cols = n_link_cols + end + len(self.scalars)
+
+    def link(self, src, dst):
+        start = self.link_index[src, dst] * self.end
+        return slice(start, start + self.end)
+
+    def columns(self, link_ids):
+        """``(len(link_ids), end)`` column numbers of the given (free) topology links."""
+        return self.positions[np.asarray(link_ids, dtype=np.int64)][:, None] * self.end + np.arange(self.end)
+
+    def weight(self):
+        return np.ones(self.end) if self.weights is None else self.weights
+
+    def bounds(self):
+        lb = np.zeros(self.n_cols)
+        ub = np.full(self.n_cols, np.inf)
+        for link, (low, high) in self.topology.bounds.items():
+            if link in self.link_index:
+                lb[self.link(*link)] = low
+                ub[self.link(*link)] = high
+        return lb, ub
+
+    @property
+    def full(self):
+        """Layout with a column block for every link of the topology."""
+        return Layout(self.end, self.topology, self.weights) if self.fixed else self
+
+    def restrict(self, x):
+        """Vector ``x`` of the ``full`` layout cut to the columns of this one (inverse of expand)."""
+        if not self.fixed:
+            return x
+        full = self.full
+        flows = x[:full.cum_sum.start].reshape(len(full.links), self.end)
+        return np.concatenate([flows[self.positions >= 0].ravel(), x[full.cum_sum.start:]])
+
+    def expand(self, x):
+        """Solution vector ``x`` of this layout laid out by ``full``, fixed flows included."""
+        if not self.fixed:
+            return x
+        full = self.full
+        out = np.empty(full.n_cols)
+        flows = out[:full.cum_sum.start].reshape(len(full.links), self.end)
+        flows[self.positions >= 0] = x[:self.cum_sum.start].reshape(len(self.links), self.end)
+        for k, values in self.fixed.items():
+            flows[k] = values
+        out[full.cum_sum.start:] = x[self.cum_sum.start:]
+        return out
+
+
+class ConstraintBlock:
+    """One named constraint family ``A @ x (sense) rhs``."""
+
+    def __init__(self, name, A, sense, rhs):
+        self.name = name
+        self.A = A
+        self.sense = sense
+        self.rhs = rhs
+
+
+def link_rows(layout, link_ids, coefs, rhs=0.0):
+    """Per-timestep rows ``sum(coef * link[t]) == rhs[t]`` over the links numbered ``link_ids``.
+
+    The sparsity structure comes from the topology cache; only the
+    coefficients are filled in.
+    """
+    end = layout.end
+    indptr, indices, order = layout.topology.row_structure(layout.positions[link_ids], end)
+    data = np.tile(np.asarray(coefs, dtype=float)[order], end)
+    A = sp.csr_matrix((data, indices, indptr), shape=(end, layout.n_cols))
+    b = np.broadcast_to(np.asarray(rhs, dtype=float), (end,)).copy()
+    return A, b
+
+
+def fixed_flows(profiles, end, params, topology):
+    """Flows pinned by a single-link equation to a profile, by topology link number.
+
+    Raises ValueError when a pinned flow leaves the bounds of its link.
+    """
+    fixed = {}
+    for equation in topology.equations:
+        if equation.profile is None or len(equation.link_ids) != 1 or int(equation.link_ids[0]) in fixed:
+            continue
+        k = int(equation.link_ids[0])
+        values = (profiles[equation.profile][:end] * coefficient(equation.factor, params)
+                  / coefficient(equation.coefs[0], params))
+        low, high = topology.bounds[topology.links[k]]
+        if values.min() < low - 1e-9 or values.max() > high + 1e-9:
+            raise ValueError('%s fixes %s -> %s outside its bounds' % ((equation.name,) + topology.links[k]))
+        fixed[k] = values
+    return fixed
+
+
+def substitute(layout, spec, tol=1e-6):
+    """Row specification ``spec`` with the fixed links moved to its right-hand side (None if none is left)."""
+    name, link_ids, coefs, rhs = spec
+    link_ids = np.asarray(link_ids, dtype=np.int64)
+    coefs = np.asarray(coefs, dtype=float)
+    free = layout.positions[link_ids] >= 0
+    if free.all():
+        return spec
+    rhs = np.broadcast_to(np.asarray(rhs, dtype=float), (layout.end,)).copy()
+    for k, coef in zip(link_ids[~free], coefs[~free]):
+        rhs -= coef * layout.fixed[k]
+    if free.any():
+        return name, link_ids[free], coefs[free], rhs
+    # every flow is fixed: the row only checks that they agree
+    if np.abs(rhs).max() > tol:
+        raise ValueError('%s cannot hold with the flows fixed by the profiles' % name)
+    return None
+
+
+def assemble(profiles, end, params, initial_storage=0.0, final_storage=0.0, weights=None, topology=None,
+             presolve=True):
+    """Return the constraint blocks of the model described by ``topology``.
+
+    ``initial_storage`` is the cum_sum level before the first timestep and
+    ``final_storage`` the level required after the last one (None leaves it
+    free); the defaults give the zero-net gas storage of the full year.
+    With ``weights`` every timestep counts that many times in the storage
+    dynamics and in the totals.
+
+    With ``presolve`` the links pinned by an equation to a profile (demands,
+    PV production, the COPs of the needs) get no columns: their flows are
+    substituted as constants into the other rows and restored by
+    ``Layout.expand``.
+    """
+    topology = topology or default_topology
+    fixed = fixed_flows(profiles, end, params, topology) if presolve else None
+    layout = Layout(end, topology, weights, fixed)
+    weight = layout.weight()
+    blocks = []
+
+    # Creation of conservation constraint for each hub
+    specs = [('hub_' + net,) + topology.hub_terms[net] + (0.0,) for net in topology.hubs]
+
+    # demands, productions, COP and conversion ratios
+    for equation in topology.equations:
+        coefs = [coefficient(coef, params) for coef in equation.coefs]
+        rhs = 0.0
+        if equation.profile is not None:
+            rhs = profiles[equation.profile][:end] * coefficient(equation.factor, params)
+        specs.append((equation.name, equation.link_ids, coefs, rhs))
+    if layout.fixed:
+        specs = [spec for spec in (substitute(layout, spec) for spec in specs) if spec is not None]
+
+    for name, link_ids, coefs, rhs in specs:
+        with phase(name):
+            A, b = link_rows(layout, link_ids, coefs, rhs)
+            blocks.append(ConstraintBlock(name, A, '=', b))
+
+    # cumulative storage: cum_sum[i] == normal[i] + cum_sum[i - 1], cum_sum[0] == initial + normal[0]
+    normal = layout.link(*topology.storage)
+    with phase('cum_sum'):
+        diff = sp.eye(end) - sp.eye(end, k=-1)
+        A = sp.hstack([sp.csr_matrix((end, layout.cum_sum.start)), diff,
+                       sp.csr_matrix((end, layout.n_cols - layout.cum_sum.stop))])
+        A = (A - sp.csr_matrix((weight, (np.arange(end), np.arange(normal.start, normal.stop))),
+                               shape=(end, layout.n_cols))).tocsr()
+        rhs = np.zeros(end)
+        rhs[0] = initial_storage
+        blocks.append(ConstraintBlock('cum_sum', A, '=', rhs))
+
+    # gas storage
+    if final_storage is not None:
+        A = sp.csr_matrix((weight, (np.zeros(end, dtype=int), np.arange(normal.start, normal.stop))),
+                          shape=(1, layout.n_cols))
+        blocks.append(ConstraintBlock(topology.storage[0], A, '=',
+                                      np.array([final_storage - initial_storage])))
+
+    # creation of the objective function elements
+    for name, terms in topology.totals.items():
+        with phase(name):
+            terms = [(link, -coefficient(coef, params)) for link, coef in terms]
+            # fixed flows are constants of the total
+            rhs = -sum(coef * (weight @ layout.fixed[topology.link_index[link]])
+                       for link, coef in terms if link not in layout.link_index)
+            terms = [(link, coef) for link, coef in terms if link in layout.link_index]
+            blocks.append(ConstraintBlock(name, scalar_row(layout, name, terms), '=', np.array([float(rhs)])))
+    return layout, blocks
+
+
+def scalar_row(layout, name, terms):
+    """Single row ``name + sum(coef * sum_t weight[t] * link[t]) == 0``."""
+    ids = layout.topology.link_ids([link for link, _ in terms])
+    coefs = np.array([coef for _, coef in terms], dtype=float)
+    cols = np.concatenate([[layout.scalars[name]], layout.columns(ids).ravel()])
+    data = np.concatenate([[1.0], np.outer(coefs, layout.weight()).ravel()])
+    return sp.csr_matrix((data, (np.zeros(len(cols), dtype=np.int64), cols)), shape=(1, layout.n_cols))
+
+
+class GeneralConstraint:
+    """``res == max(x[cols], constant)`` (kind 'max') or the 'min' counterpart."""
+
+    def __init__(self, kind, res, cols, constant=None):
+        self.kind = kind
+        self.res = res
+        self.cols = cols
+        self.constant = constant
+
+
+class Objective:
+    """Linear objective ``c @ x`` of the lexicographic hierarchy."""
+
+    def __init__(self, name, c, priority, rel_tol=0.0):
+        self.name = name
+        self.c = c
+        self.priority = priority
+        self.rel_tol = rel_tol
+
+
+class LinearProgram:
+    """Solver-neutral form of the energy_system model.
+
+    Columns follow ``layout``; rows are the named constraint blocks. The
+    objectives are minimized in decreasing priority, each one allowed to
+    degrade by ``rel_tol`` of its optimum while the next ones are solved.
+    """
+
+    def __init__(self, layout, blocks, lb, ub, objectives, general=()):
+        self.layout = layout
+        self.blocks = blocks
+        self.lb = lb
+        self.ub = ub
+        self.objectives = sorted(objectives, key=lambda obj: -obj.priority)
+        self.general = list(general)
+
+    @property
+    def n_cols(self):
+        return self.layout.n_cols
+
+    @property
+    def n_rows(self):
+        return sum(block.A.shape[0] for block in self.blocks)
+
+    def block(self, name):
+        for block in self.blocks:
+            if block.name == name:
+                return block
+        raise KeyError(name)
+
+    def row_offset(self, name):
+        """Index of the first row of block ``name`` in the stacked matrix."""
+        offset = 0
+        for block in self.blocks:
+            if block.name == name:
+                return offset
+            offset += block.A.shape[0]
+        raise KeyError(name)
+
+    def row_bounds(self):
+        """Stacked ``lower <= A @ x <= upper`` form of all blocks."""
+        A = sp.vstack([block.A for block in self.blocks], format='csr')
+        lower, upper = [], []
+        for block in self.blocks:
+            rhs = np.asarray(block.rhs, dtype=float)
+            lower.append(rhs if block.sense in '=>' else np.full(rhs.shape, -np.inf))
+            upper.append(rhs if block.sense in '=<' else np.full(rhs.shape, np.inf))
+        return A, np.concatenate(lower), np.concatenate(upper)
+
+    def scalar_objective(self, coefs):
+        c = np.zeros(self.n_cols)
+        for name, coef in coefs.items():
+            c[self.layout.scalars[name]] = coef
+        return c
+
+
+def envelope_block(layout, name, kind, res, cols):
+    """Epigraph rows ``x[cols] <= res`` (kind 'max') or ``res <= x[cols]`` (kind 'min')."""
+    n = len(cols)
+    sign = 1.0 if kind == 'max' else -1.0
+    rows = np.concatenate([np.arange(n), np.arange(n)])
+    data = np.concatenate([np.full(n, sign), np.full(n, -sign)])
+    A = sp.csr_matrix((data, (rows, np.concatenate([cols, np.full(n, res)]))), shape=(n, layout.n_cols))
+    return ConstraintBlock('envelope_' + name, A, '<', np.zeros(n))
+
+
+def build_program(profiles, end=None, params=None, secondary='storage',
+                  initial_storage=0.0, final_storage=0.0, envelope_constants=None, envelope='auto',
+                  weights=None, topology=None, presolve=True):
+    """Build the model of ``topology`` (topology.json by default) from the profils series.
+
+    ``secondary`` selects the second objective of the hierarchy (see
+    the secondary objectives of the topology); the primary one, ext_feeder,
+    always has the highest priority.
+    Only the max/min envelope terms used by that objective are modelled.
+
+    ``envelope`` chooses their formulation: 'genconstr' for Gurobi max/min
+    general constraints (a MIP), 'lp' for epigraph rows (value_max >=
+    cum_sum[i], value_min <= cum_sum[i]) keeping a pure LP. The epigraph is
+    only exact when the objective pushes the term against its rows
+    (minimizing a max, maximizing a min); 'auto' uses it in that case and
+    general constraints otherwise.
+
+    ``initial_storage``/``final_storage`` set the cum_sum boundary levels
+    and ``envelope_constants`` (name -> value) folds an already known
+    max/min into an envelope term; both serve windowed solves. ``weights``
+    gives the duration of each timestep for reduced horizons and
+    ``presolve`` removes the links fixed by the profiles (see assemble).
+    """
+    with phase('build'):
+        topology = topology or default_topology
+        envelope_constants = envelope_constants or {}
+        params = dict(topology.params, **(params or {}))
+        if end is None:
+            end = min(len(series) for series in profiles.values())
+        layout, blocks = assemble(profiles, end, params, initial_storage, final_storage, weights, topology,
+                                  presolve)
+        lb, ub = layout.bounds()
+
+        # max/min envelope terms over the cumulative storage or a link
+        envelopes = {}
+        for name, (kind, of) in topology.envelopes.items():
+            if of != 'cum_sum' and of not in layout.link_index:
+                # envelope of a flow fixed by the presolve: a constant
+                values = np.append(layout.fixed[topology.link_index[of]], envelope_constants.get(name, []))
+                lb[layout.scalars[name]] = ub[layout.scalars[name]] = values.max() if kind == 'max' else values.min()
+                continue
+            span = layout.cum_sum if of == 'cum_sum' else layout.link(*of)
+            envelopes[name] = (kind, np.arange(span.start, span.stop))
+        general = []
+        for name, (kind, cols) in envelopes.items():
+            coef = topology.secondary[secondary].get(name)
+            if coef is None:
+                continue
+            res = layout.scalars[name]
+            constant = envelope_constants.get(name)
+            convex = (kind == 'max') == (coef > 0)
+            if envelope == 'genconstr' or (envelope == 'auto' and not convex):
+                general.append(GeneralConstraint(kind, res, cols, constant))
+                continue
+            if not convex:
+                raise ValueError('%s cannot be written as an epigraph when the objective %s it'
+                                 % (name, 'maximizes' if kind == 'max' else 'minimizes'))
+            blocks.append(envelope_block(layout, name, kind, res, cols))
+            if constant is not None:
+                if kind == 'max':
+                    lb[res] = max(lb[res], constant)
+                else:
+                    ub[res] = min(ub[res], constant)
+
+        program = LinearProgram(layout, blocks, lb, ub, [], general)
+        primary = topology.primary
+        program.objectives = [
+            Objective(primary['name'], program.scalar_objective(primary['terms']), 2,
+                      coefficient(primary.get('rel_tol', 0.0), params)),
+            Objective(secondary, program.scalar_objective(topology.secondary[secondary]), 1),
+        ]
+    return program
@@ -0,0 +1,182 @@
+"""MPS export of the energy_system model and import of solution files.
+
+``write_mps`` writes a model_builder.LinearProgram to a free-format MPS
+file, gzip-compressed when the name ends in ``.gz``, without going through
+a solver. The whole program is in memory, plus a CSC copy of the stacked
+constraint matrix, so peak memory still grows with the model: only the
+names and text lines are produced per chunk, one link block (``end``
+columns) of the COLUMNS and BOUNDS sections and one constraint block of
+the ROWS and RHS sections at a time.
+``read_sol`` maps a ``name value`` solution file (Gurobi/CBC ``.sol`` or a
+HiGHS solution file) back onto the program layout.
+
+Columns are named ``src.dst.t``, ``cum_sum.t`` and by scalar name; rows are
+named ``block.i``.
+
+    python mps.py model.mps.gz --end 35121 --secondary rejects
+"""
+import argparse
+import gzip
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from backends import Solution
+from model_builder import ConstraintBlock, build_program
+from profile_store import data_folder, load_profiles
+
+SENSES = {'=': 'E', '<': 'L', '>': 'G'}
+
+
+def column_names(layout, cols=None):
+    """Names of the columns numbered ``cols`` of ``layout`` (all of them by default)."""
+    cols = np.arange(layout.n_cols) if cols is None else np.asarray(cols)
+    names = np.empty(len(cols), dtype=object)
+    flows = cols < layout.cum_sum.start
+    if flows.any():
+        prefixes = np.array(['%s.%s.' % link for link in layout.links])
+        names[flows] = np.char.add(prefixes[cols[flows] // layout.end], (cols[flows] % layout.end).astype(str))
+    cum_sum = ~flows & (cols < layout.cum_sum.stop)
+    if cum_sum.any():
+        names[cum_sum] = np.char.add('cum_sum.', (cols[cum_sum] - layout.cum_sum.start).astype(str))
+    scalars = cols >= layout.cum_sum.stop
+    if scalars.any():
+        names[scalars] = np.array(sorted(layout.scalars, key=layout.scalars.get))[cols[scalars] - layout.cum_sum.stop]
+    return names
+
+
+def row_names(blocks, rows):
+    """Names of the rows numbered ``rows`` of the stacked ``blocks``."""
+    # a column chunk holds few distinct rows: name each one once
+    rows, inverse = np.unique(rows, return_inverse=True)
+    offsets = np.cumsum([0] + [block.A.shape[0] for block in blocks])
+    k = np.searchsorted(offsets, rows, side='right') - 1
+    prefixes = np.array([block.name + '.' for block in blocks])
+    return np.char.add(prefixes[k], (rows - offsets[k]).astype(str)).astype(object)[inverse]
+
+
+def open_text(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', compresslevel=1)
+    return open(path, mode)
+
+
+def format_values(values):
+    # few distinct coefficients: format each one once
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([repr(value) for value in unique.tolist()], dtype=object)[inverse].tolist()
+
+
+def write_mps(program, path, objective=None, objective_bounds=None, name='energy_system'):
+    """Write ``program`` to ``path`` with a single objective.
+
+    ``objective`` names the objective to write (the highest priority one by
+    default). ``objective_bounds`` maps other objective names to an upper
+    bound on their value, e.g. ``{'Ext_feeder': 1.1 * optimum}`` to export
+    the second stage of the lexicographic hierarchy.
+    """
+    if program.general:
+        raise ValueError('general max/min constraints cannot be written to MPS, build with envelope="lp"')
+    objectives = {obj.name: obj for obj in program.objectives}
+    c = objectives[objective or program.objectives[0].name].c
+    blocks = list(program.blocks)
+    for bounded, bound in (objective_bounds or {}).items():
+        row = objectives[bounded].c
+        blocks.append(ConstraintBlock('bound_' + bounded, sp.csr_matrix(row), '<', np.array([bound])))
+
+    A = sp.vstack([block.A for block in blocks], format='csc')
+    layout = program.layout
+    lb, ub = program.lb, program.ub
+    chunk = layout.end
+    with open_text(path, 'w') as file:
+        file.write('NAME %s\nROWS\n N obj\n' % name)
+        for block in blocks:
+            n = block.A.shape[0]
+            file.write((' %s %s.%%d\n' % (SENSES[block.sense], block.name)) * n % tuple(range(n)))
+
+        file.write('COLUMNS\n')
+        for start in range(0, program.n_cols, chunk):
+            stop = min(start + chunk, program.n_cols)
+            entries = slice(A.indptr[start], A.indptr[stop])
+            counts = np.diff(A.indptr[start:stop + 1])
+            # objective entry first (explicit for the empty columns, so every column is declared),
+            # then the matrix entries of each column
+            obj = start + np.flatnonzero((c[start:stop] != 0) | (counts == 0))
+            col = np.concatenate([obj, np.repeat(np.arange(start, stop), counts)])
+            row = np.concatenate([np.full(len(obj), 'obj', dtype=object), row_names(blocks, A.indices[entries])])
+            value = np.concatenate([c[obj], A.data[entries]])
+            order = np.argsort(col, kind='stable')
+            names = column_names(layout, np.arange(start, stop))
+            file.write(''.join(' %s %s %s\n' % item for item in
+                               zip(names[col[order] - start].tolist(), row[order].tolist(),
+                                   format_values(value[order]))))
+
+        file.write('RHS\n')
+        for block in blocks:
+            rhs = np.broadcast_to(np.asarray(block.rhs, dtype=float), (block.A.shape[0],))
+            nz = np.flatnonzero(rhs)
+            file.write(''.join(' rhs %s.%d %s\n' % (block.name, i, value)
+                               for i, value in zip(nz.tolist(), format_values(rhs[nz]))))
+
+        file.write('BOUNDS\n')
+        for start in range(0, program.n_cols, chunk):
+            cols = start + np.flatnonzero((lb[start:start + chunk] != 0) | np.isfinite(ub[start:start + chunk]))
+            lines = []
+            for j, col in zip(cols.tolist(), column_names(layout, cols).tolist()):
+                if np.isinf(lb[j]) and np.isinf(ub[j]):
+                    lines.append(' FR bnd %s\n' % col)
+                    continue
+                if np.isinf(lb[j]):
+                    lines.append(' MI bnd %s\n' % col)
+                elif lb[j]:
+                    lines.append(' LO bnd %s %r\n' % (col, float(lb[j])))
+                if np.isfinite(ub[j]):
+                    lines.append(' UP bnd %s %r\n' % (col, float(ub[j])))
+            file.write(''.join(lines))
+        file.write('ENDATA\n')
+
+
+def read_sol(path, program):
+    """Solution of ``program`` read from a ``name value`` solution file.
+
+    Lines starting with '#' and unknown names are skipped; reading stops at
+    the row section of HiGHS solution files.
+    """
+    layout = program.layout
+    # column names are parsed rather than listed: 'src.dst.t', 'cum_sum.t' or a scalar name
+    starts = {'%s.%s' % link: k * layout.end for k, link in enumerate(layout.links)}
+    starts['cum_sum'] = layout.cum_sum.start
+    x = np.zeros(program.n_cols)
+    with open_text(path, 'r') as file:
+        for line in file:
+            if line.startswith('# Rows'):
+                break
+            if line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            if fields[0] in layout.scalars:
+                x[layout.scalars[fields[0]]] = float(fields[1])
+                continue
+            prefix, _, t = fields[0].rpartition('.')
+            if prefix in starts and t.isdigit() and int(t) < layout.end:
+                x[starts[prefix] + int(t)] = float(fields[1])
+    objective_values = {obj.name: float(obj.c @ x) for obj in program.objectives}
+    return Solution(program.layout.full, program.layout.expand(x), objective_values, 'file', 0.0, 'file')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='MPS file, gzip-compressed if it ends in .gz')
+    parser.add_argument('--end', type=int, default=35121)
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--folder', default=data_folder)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    program = build_program(load_profiles(args.folder, args.end), args.end, secondary=args.secondary,
+                            envelope='lp')
+    write_mps(program, args.output)
+    print('%d rows x %d columns written to %s in %.1f s'
+          % (program.n_rows, program.n_cols, args.output, time.perf_counter() - start))
@@ -0,0 +1,137 @@
+"""Parallel epsilon-constraint Pareto front of ext_feeder against a secondary objective.
+
+The lexicographic hierarchy of the scripts yields a single point. Here the
+two ends of the front are solved first: ext_feeder at its minimum (then
+the secondary objective at that cost) and the secondary objective at its
+minimum (then ext_feeder). In between, ext_feeder is capped at ``points``
+evenly spaced values: each cap is an upper bound on the ext_feeder scalar
+column, and the point minimizes the secondary objective, then ext_feeder
+at that value, so every point of the front is efficient.
+
+The caps are handed out in contiguous chunks to worker processes. A worker
+loads its model once and, from one cap to the next, only changes the
+bound and re-solves from the basis of the neighbouring point. Every point
+can be saved to a result_store (full time series, with the cap as
+metadata) and the front is written as a CSV table.
+
+    python pareto.py --end 2688 --secondary rejects --points 16 --workers 4 --store pareto_store
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backends import get_backend
+from model_builder import Objective, build_program
+from profile_store import data_folder, load_profiles
+from result_store import ResultStore
+
+_profiles = None
+
+
+def _init_worker(folder, end):
+    global _profiles
+    _profiles = load_profiles(folder, end)
+
+
+def epsilon_program(profiles, end, params=None, secondary='storage'):
+    """Program minimizing ``secondary`` first, then ext_feeder; its ext_feeder scalar takes the cap."""
+    program = build_program(profiles, end, params, secondary)
+    primary, second = program.objectives
+    program.objectives = [Objective(second.name, second.c, 2), Objective(primary.name, primary.c, 1)]
+    return program
+
+
+def cap_column(program):
+    """Column of the scalar bounded by the caps (the only term of the primary objective)."""
+    return int(np.flatnonzero(program.objectives[-1].c)[0])
+
+
+def anchors(profiles, end, params=None, secondary='storage', backend=None, **options):
+    """Objective values at both ends of the front: ext_feeder first, then the secondary first."""
+    cheapest = get_backend(backend, **options).solve(
+        build_program(profiles, end, dict(params or {}, rel_tol=0.0), secondary))
+    flattest = get_backend(backend, **options).solve(epsilon_program(profiles, end, params, secondary))
+    return cheapest.objective_values, flattest.objective_values
+
+
+def _solve_caps(task):
+    """Solve consecutive caps on one loaded model, each from the basis of the previous one."""
+    caps, end, params, secondary, backend, threads, store, front = task
+    program = epsilon_program(_profiles, end, params, secondary)
+    column = cap_column(program)
+    solver = get_backend(backend, threads=threads)
+    solver.load(program)
+    rows = []
+    for point, cap in caps:
+        row = {'point': point, 'cap': cap}
+        start = time.perf_counter()
+        ub = program.ub.copy()
+        ub[column] = cap
+        solver.change_bounds(program.lb, ub)
+        try:
+            solution = solver.run(program)
+        except RuntimeError as error:
+            row['status'] = 'error: %s' % error
+            rows.append(row)
+            continue
+        row['status'] = solution.status
+        row['solve_time'] = time.perf_counter() - start
+        row.update(solution.objective_values)
+        if store is not None:
+            row['run'] = ResultStore(store).save(solution, params, run='%s_%03d' % (front, point),
+                                                 secondary=secondary, front=front, cap=cap)
+        rows.append(row)
+    return rows
+
+
+def pareto_front(end, secondary='storage', points=11, folder=data_folder, params=None, workers=None, threads=1,
+                 backend=None, store=None, output=None, front='front'):
+    """Solve ``points`` caps between the two ends of the front; return one row per point."""
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads)
+    profiles = load_profiles(folder, end)  # build the profile store once, before the workers map it
+    low, high = anchors(profiles, end, params, secondary, backend, threads=threads)
+    name = [objective for objective in low if objective != secondary][0]
+    if np.isclose(low[name], high[name]):
+        points = 1  # no trade-off: the front is a single point
+    # a hair above each cap, so the cheapest end stays feasible
+    caps = np.linspace(low[name], high[name], points) * (1 + 1e-9) + 1e-9
+    chunks = [chunk for chunk in np.array_split(np.arange(points), workers) if len(chunk)]
+    tasks = [([(int(k), float(caps[k])) for k in chunk], end, params, secondary, backend, threads, store, front)
+             for chunk in chunks]
+    with ProcessPoolExecutor(len(tasks), initializer=_init_worker, initargs=(folder, end)) as pool:
+        rows = [row for part in pool.map(_solve_caps, tasks) for row in part]
+
+    if output is not None:
+        columns = []
+        for row in rows:
+            columns += [column for column in row if column not in columns]
+        with open(output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--end', type=int, default=35121)
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--points', type=int, default=11)
+    parser.add_argument('--folder', default=data_folder)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threads', type=int, default=1, help='solver threads per worker')
+    parser.add_argument('--backend')
+    parser.add_argument('--store', help='folder where the time series of every point are saved')
+    parser.add_argument('--front', default='front', help='run name prefix of the points in the store')
+    parser.add_argument('--output', default='pareto_front.csv')
+    args = parser.parse_args()
+    rows = pareto_front(args.end, args.secondary, args.points, args.folder, workers=args.workers,
+                        threads=args.threads, backend=args.backend, store=args.store, output=args.output,
+                        front=args.front)
+    for row in rows:
+        print(row['point'], row['status'], row.get('Ext_feeder'), row.get(args.secondary))
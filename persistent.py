@@ -0,0 +1,67 @@
+"""Persistent energy_system model for consecutive scenario variants.
+
+The model is loaded into the solver once. ``update`` rebuilds the neutral
+program for the new parameters or profiles (a sub-second array operation),
+diffs it block by block against the loaded one and pushes only the changed
+right-hand sides, coefficients, bounds and objectives to the solver, which
+then re-solves from the basis of the previous run instead of cold-starting.
+"""
+import numpy as np
+
+from backends import get_backend
+from model_builder import DEFAULT_PARAMS, build_program
+
+
+class PersistentModel:
+    """energy_system model kept alive in a backend between scenario variants.
+
+    Updates must keep the structure of the model (same horizon, secondary
+    objective and envelope formulation); anything else needs a new instance.
+    """
+
+    def __init__(self, profiles, end=None, params=None, secondary='storage', envelope='auto',
+                 backend=None, **options):
+        self.profiles = profiles
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.secondary = secondary
+        self.envelope = envelope
+        self.program = build_program(profiles, end, self.params, secondary, envelope=envelope)
+        self.end = self.program.layout.end
+        self.backend = get_backend(backend, **options)
+        self.backend.load(self.program)
+
+    def solve(self):
+        return self.backend.run(self.program)
+
+    def update(self, params=None, profiles=None):
+        """Apply new parameter values and/or profiles to the loaded model.
+
+        Returns the number of right-hand sides and coefficients changed.
+        """
+        if params:
+            self.params.update(params)
+        if profiles is not None:
+            self.profiles = profiles
+        program = build_program(self.profiles, self.end, self.params, self.secondary, envelope=self.envelope)
+        old = self.program
+        if ([block.name for block in program.blocks] != [block.name for block in old.blocks]
+                or len(program.objectives) != len(old.objectives) or len(program.general) != len(old.general)):
+            raise ValueError('the update changes the model structure, build a new PersistentModel')
+
+        changed = 0
+        for k, (block, old_block) in enumerate(zip(program.blocks, old.blocks)):
+            if block.A.shape != old_block.A.shape:
+                raise ValueError('block %r changed shape' % block.name)
+            if not np.array_equal(block.rhs, old_block.rhs):
+                self.backend.change_rhs(k, block.rhs)
+                changed += np.count_nonzero(block.rhs != old_block.rhs)
+            diff = (block.A - old_block.A).tocoo()
+            diff.eliminate_zeros()
+            if diff.nnz:
+                values = np.asarray(block.A[diff.row, diff.col]).ravel()
+                self.backend.change_coefficients(k, diff.row, diff.col, values)
+                changed += diff.nnz
+        if not (np.array_equal(program.lb, old.lb) and np.array_equal(program.ub, old.ub)):
+            self.backend.change_bounds(program.lb, program.ub)
+        self.program = program
+        return changed
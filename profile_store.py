@@ -0,0 +1,120 @@
+"""Binary cache of the profils/*.json demand and production series.
+
+The six JSON files are parsed once and written as rows of a single float64
+``.npy`` matrix next to a small JSON index (row names, lengths and the
+sha256 of each source file). Later runs memory-map that matrix and hand out
+zero-copy views; a source file whose checksum changed triggers a rebuild.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from profiling import phase
+
+data_folder = 'profils'
+PROFILE_FILES = {
+    'cooling_needs': 'aggregated_cooling_needs.json',
+    'heating_needs_gas': 'aggregated_heating_needs_gas.json',
+    'heating_needs_net': 'aggregated_heating_needs_net.json',
+    'solar_prod': 'aggregated_pv_prod.json',
+    'sub_need': 'aggregated_heating_needs_sub.json',
+    'electricity_need': 'aggregated_elec_services.json',
+}
+store_name = 'profiles_store'
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProfileStore:
+    """Memory-mapped ``(n_profiles, length)`` float64 matrix of the profils series."""
+
+    def __init__(self, folder=data_folder, files=None, name=store_name):
+        self.folder = folder
+        self.files = dict(PROFILE_FILES if files is None else files)
+        self.array_path = os.path.join(folder, name + '.npy')
+        self.index_path = os.path.join(folder, name + '.index.json')
+        self._array = None
+        self._index = None
+
+    def read_index(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.array_path)):
+            return None
+        with open(self.index_path, 'r') as file:
+            return json.load(file)
+
+    def is_fresh(self):
+        """True when every profile is stored and matches its source JSON, if any."""
+        index = self.read_index()
+        if index is None:
+            return False
+        for name, file_name in self.files.items():
+            if name not in index['names']:
+                return False
+            source = os.path.join(self.folder, file_name)
+            if os.path.exists(source) and file_checksum(source) != index['checksums'][name]:
+                return False
+        return True
+
+    def build(self):
+        """Parse the source JSON files and (re)write the store."""
+        profiles, checksums = {}, {}
+        for name, file_name in self.files.items():
+            source = os.path.join(self.folder, file_name)
+            with open(source, 'r') as file:
+                profiles[name] = np.asarray(json.load(file), dtype=float)
+            checksums[name] = file_checksum(source)
+        self.write(profiles, checksums)
+
+    def write(self, profiles, checksums):
+        """Store ``profiles`` (name -> 1-D array); shorter rows are NaN padded."""
+        names = list(profiles)
+        lengths = [len(profiles[name]) for name in names]
+        array = np.full((len(names), max(lengths)), np.nan)
+        for row, name in enumerate(names):
+            array[row, :lengths[row]] = profiles[name]
+        os.makedirs(self.folder, exist_ok=True)
+        # write then rename so a concurrent reader never maps a half-written file
+        tmp_array = self.array_path + '.tmp.npy'
+        np.save(tmp_array, array)
+        os.replace(tmp_array, self.array_path)
+        index = {'names': names, 'lengths': dict(zip(names, lengths)), 'checksums': dict(checksums)}
+        tmp_index = self.index_path + '.tmp'
+        with open(tmp_index, 'w') as file:
+            json.dump(index, file)
+        os.replace(tmp_index, self.index_path)
+        self._array = None
+        self._index = None
+
+    def open(self):
+        if self._array is None:
+            if not self.is_fresh():
+                self.build()
+            self._index = self.read_index()
+            self._array = np.load(self.array_path, mmap_mode='r')
+        return self._array
+
+    def profile(self, name, start=0, end=None):
+        """Read-only view of ``name[start:end]`` into the mapped file."""
+        array = self.open()
+        row = self._index['names'].index(name)
+        length = self._index['lengths'][name]
+        end = length if end is None else min(end, length)
+        return array[row, start:end]
+
+    def load(self, start=0, end=None):
+        self.open()
+        return {name: self.profile(name, start, end) for name in self.files}
+
+
+def load_profiles(folder=data_folder, end=None, start=0):
+    """The six profils series as zero-copy views cut to ``[start:end]``."""
+    with phase('load_profiles'):
+        return ProfileStore(folder).load(start, end)
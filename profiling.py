@@ -0,0 +1,117 @@
+"""Phase timing, peak memory and solver statistics of a run.
+
+    profiler = Profiler('scenario_2').start()
+    ...  # load, build, solve, save, render
+    profiler.stop()
+    profiler.write('profile_scenario_2.json')
+
+While a Profiler is active, the instrumented steps record their wall time
+under a '/'-separated phase name: profile loading, the builder and each of
+its constraint families ('build/cop_heating', 'build/hub_lv', ...), the
+solver load (per block for Gurobi), every objective solve, value
+extraction, result saving and each rendered figure. ``phase`` costs a
+function call when no profiler is active. The JSON profile also holds the
+peak resident memory reached at the end of every phase and the solver
+statistics of each objective (see Backend.stats), with the presolved model
+size when the solve asks for ``presolve_stats``.
+"""
+import contextlib
+import json
+import resource
+import sys
+import time
+
+_active = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time the enclosed block as ``name`` in the active profiler, if any."""
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    profiler.stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add('/'.join(profiler.stack), time.perf_counter() - start)
+        profiler.stack.pop()
+
+
+class Profiler:
+    """Accumulated phase times, peak RSS and solver statistics of one run."""
+
+    def __init__(self, name='run', **metadata):
+        self.name = name
+        self.metadata = metadata
+        self.phases = {}
+        self.stack = []
+        self.solver = {}
+        self.total = None
+        self.previous = None
+
+    def add(self, name, seconds):
+        entry = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        entry['peak_rss_mb'] = peak_rss_mb()
+
+    def start(self):
+        global _active
+        self.previous = _active
+        _active = self
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self):
+        global _active
+        self.total = time.perf_counter() - self.started
+        _active = self.previous
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record_solution(self, solution):
+        """Keep the per-objective solver statistics of ``solution``.
+
+        A solution read from the scenario cache was not solved by this run:
+        its statistics, those of the solve that filled the cache, are kept
+        under 'cached' instead.
+        """
+        if getattr(solution, 'cached', False):
+            self.solver['cached'] = dict(solution.stats)
+        else:
+            self.solver.update(solution.stats)
+
+    def report(self):
+        return {
+            'name': self.name,
+            'metadata': self.metadata,
+            'total_seconds': self.total,
+            'peak_rss_mb': peak_rss_mb(),
+            'phases': self.phases,
+            'solver': self.solver,
+        }
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=1, default=float)
+
+    def summary(self, top=10):
+        """Text table of the slowest phases."""
+        rows = sorted(self.phases.items(), key=lambda item: -item[1]['seconds'])[:top]
+        return '\n'.join('%-40s %8.3f s %6d calls %8.0f MB' % (name, entry['seconds'], entry['calls'],
+                                                            entry['peak_rss_mb'])
+                         for name, entry in rows)
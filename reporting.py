@@ -0,0 +1,148 @@
+"""Headless rendering of the standard figures of a run.
+
+Figures are drawn on Agg canvases (matplotlib.figure.Figure, no pyplot
+state and no display) and written to files. Series longer than ``points``
+are decimated by keeping the minimum and maximum of every bucket, in time
+order, so peaks survive while a full year draws a few thousand markers
+instead of 35121. ``render_runs`` renders many stored runs in parallel.
+
+    python reporting.py results_store reports --workers 8
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
+
+from profiling import phase
+from result_store import ResultStore, store_folder
+from results import POWER
+
+STYLE = {
+    'xtick.labelsize': 20,
+    'ytick.labelsize': 20,
+    'legend.fontsize': 20,
+    'axes.labelsize': 20,
+}
+
+# series name -> link
+LINKS = {
+    'pv': ('pv', 'lv'),
+    'mv': ('mv', 'lv'),
+    'lv_mv': ('lv', 'mv'),
+    'elec': ('lv', 'electricity_direct'),
+    'lv_p2g': ('lv', 'p2g'),
+    'storage': ('gas_storage', 'gas'),
+}
+
+# figure name -> panels, each panel (ylabel, [(series, marker, color, label)])
+FIGURES = {
+    'overview': [
+        (None, [('pv', '.', 'green', 'pv'), ('mv', '.', 'blue', 'mv'), ('lv_mv', '.', 'red', 'lv_mv')]),
+        (None, [('storage', '.', 'blue', 'storage')]),
+    ],
+    'mv_lv_exchange': [
+        ('Electricité [kw]', [('mv', '.', 'blue', 'MV feeder vers LV'), ('lv_mv', '.', 'red', 'LV vers MV feeder')]),
+    ],
+    'pv_mv': [
+        ('Electricité [kw]', [('pv', '.', 'green', 'PV'), ('mv', '.', 'blue', 'MV feeder')]),
+    ],
+    'storage_cumsum': [
+        ('gaz [kw]', [('storage_cumsum', '--', 'blue', 'stockage cumulé')]),
+    ],
+    'storage': [
+        ('gaz', [('storage', '--', 'blue', 'stockage')]),
+    ],
+    'pv_mv_elec': [
+        ('Electricité [kw]', [('pv', '.', 'green', 'PV'), ('mv', '.', 'blue', 'MV feeder'),
+                              ('elec', '.', 'red', 'elec')]),
+    ],
+    'power_pv': [
+        ('Electricité [kw]', [('pv', '.', 'green', 'PV'), ('power', '.', 'blue', 'power')]),
+    ],
+    'lv_p2g': [
+        ('Electricité [kw]', [('lv_mv', '--', 'blue', 'lv vers mv'), ('lv_p2g', '--', 'green', 'lv vers p2g')]),
+    ],
+}
+
+
+def decimate(series, points=4000):
+    """``(t, values)`` keeping the min and max of ``points // 2`` buckets, in time order."""
+    series = np.asarray(series)
+    n = len(series)
+    if n <= points:
+        return np.arange(n), series
+    size = -(-n // (points // 2))
+    padded = np.concatenate([series, np.full(-n % size, series[-1])]).reshape(-1, size)
+    offsets = np.arange(0, len(padded) * size, size)
+    low = offsets + padded.argmin(axis=1)
+    high = offsets + padded.argmax(axis=1)
+    t = np.unique(np.minimum(np.concatenate([low, high]), n - 1))
+    return t, series[t]
+
+
+def standard_series(results):
+    """Series of the standard figures from a results.Results."""
+    series = {name: results[link] for name, link in LINKS.items()}
+    series['storage_cumsum'] = results.storage_cumsum
+    series['power'] = results.power
+    return series
+
+
+def stored_series(store, run):
+    """Series of the standard figures read from a result_store run."""
+    series = {name: store.load(run, link) for name, link in LINKS.items()}
+    series['storage_cumsum'] = store.load(run, 'cum_sum')
+    series['power'] = sum(store.load(run, link) for link in POWER)
+    return series
+
+
+def render(series, folder, figures=None, points=4000, fmt='png', dpi=100):
+    """Write the ``figures`` (all FIGURES by default) of ``series`` to ``folder``; return the paths."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    with matplotlib.rc_context(STYLE):
+        for name in figures or FIGURES:
+            with phase('render/' + name):
+                panels = FIGURES[name]
+                fig = Figure(figsize=(8 * len(panels), 6))
+                for k, (ylabel, lines) in enumerate(panels):
+                    ax = fig.add_subplot(1, len(panels), k + 1)
+                    for key, marker, color, label in lines:
+                        t, values = decimate(series[key], points)
+                        ax.plot(t, values, marker, color=color, alpha=0.5, label=label)
+                    if ylabel:
+                        ax.set_ylabel(ylabel)
+                        ax.set_xlabel('Temps en 1/4 h')
+                    ax.legend()
+                path = os.path.join(folder, '%s.%s' % (name, fmt))
+                fig.savefig(path, dpi=dpi, bbox_inches='tight')
+                paths.append(path)
+    return paths
+
+
+def _render_run(task):
+    store_path, run, folder, options = task
+    return render(stored_series(ResultStore(store_path), run), os.path.join(folder, run), **options)
+
+
+def render_runs(store, runs=None, folder='reports', workers=None, **options):
+    """Render the figures of every run of ``store`` into ``folder/<run>/`` on a process pool."""
+    runs = store.runs() if runs is None else runs
+    tasks = [(store.folder, run, folder, options) for run in runs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(runs, pool.map(_render_run, tasks)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('store', nargs='?', default=store_folder)
+    parser.add_argument('output', nargs='?', default='reports')
+    parser.add_argument('--runs', nargs='*')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--points', type=int, default=4000)
+    args = parser.parse_args()
+    rendered = render_runs(ResultStore(args.store), args.runs, args.output, args.workers, points=args.points)
+    print('%d runs rendered to %s' % (len(rendered), args.output))
@@ -0,0 +1,91 @@
+"""Vectorized up- and downsampling of profile arrays.
+
+``upsample`` replaces the ``spread`` loop of the scenario scripts, which
+grew its output with one ``np.concatenate`` per input point (quadratic in
+the series length). All functions work along the last axis, so a 2-D stack
+of profiles is resampled in one call.
+
+    python resample.py  # benchmark against the loop on 8760-hour inputs
+"""
+import time
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+
+def upsample(profiles, n=4, method='linear'):
+    """Resample to ``n`` points per input interval.
+
+    Like the original ``spread`` the result has ``(len - 1) * n`` points:
+    point ``i * n + j`` lies ``j / n`` of the way from input ``i`` to input
+    ``i + 1``. ``method`` is 'linear', 'step' (hold the left value) or
+    'spline' (cubic spline through the inputs).
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    frac = np.arange(n) / n
+    if method == 'linear':
+        left = profiles[..., :-1, None]
+        right = profiles[..., 1:, None]
+        out = left + (right - left) * frac
+    elif method == 'step':
+        out = np.repeat(profiles[..., :-1, None], n, axis=-1)
+    elif method == 'spline':
+        length = profiles.shape[-1]
+        points = (np.arange(length - 1)[:, None] + frac).ravel()
+        return CubicSpline(np.arange(length), profiles, axis=-1)(points)
+    else:
+        raise ValueError('unknown upsampling method %r' % method)
+    return out.reshape(profiles.shape[:-1] + (-1,))
+
+
+def downsample(profiles, n=4, how='mean'):
+    """Aggregate every ``n`` consecutive points ('mean', 'sum', 'max', 'min' or 'first').
+
+    A trailing incomplete group is dropped.
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    length = profiles.shape[-1] // n * n
+    groups = profiles[..., :length].reshape(profiles.shape[:-1] + (-1, n))
+    if how == 'first':
+        return groups[..., 0]
+    return getattr(groups, how)(axis=-1)
+
+
+# Creating needs profile
+def spread(seq, n=4):
+    return upsample(seq, n)
+
+
+def spread_loop(seq, n=4):
+    # original implementation, kept as the benchmark baseline
+    seq_res = np.array([])
+    for i in range(1, len(seq)):
+        spr = np.linspace(seq[i - 1], seq[i], num=n, endpoint=False)
+        seq_res = np.concatenate((seq_res, spr))
+    return seq_res
+
+
+def benchmark(hours=8760, n=4, n_profiles=6, repeat=3, seed=0):
+    """Time spread_loop against upsample on ``n_profiles`` hourly series."""
+    profiles = np.random.default_rng(seed).random((n_profiles, hours))
+
+    def best(func):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = func()
+            times.append(time.perf_counter() - start)
+        return min(times), out
+
+    loop_time, expected = best(lambda: np.array([spread_loop(row, n) for row in profiles]))
+    vector_time, out = best(lambda: upsample(profiles, n))
+    if not np.allclose(out, expected):
+        raise AssertionError('upsample differs from the spread loop')
+    return {'hours': hours, 'profiles': n_profiles, 'loop': loop_time, 'vectorized': vector_time,
+            'speedup': loop_time / vector_time}
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print('%(profiles)d x %(hours)d hours: loop %(loop).3f s, vectorized %(vectorized).5f s '
+          '(x%(speedup).0f)' % result)
@@ -0,0 +1,134 @@
+"""Columnar store of solved runs with lazy per-link queries.
+
+Every run is saved as two files in the store folder:
+
+- ``<run>.npz``: one compressed column per link (plus ``cum_sum``), cut in
+  chunks of ``chunk`` timesteps stored as separate zip members, so reading
+  a link or a time window only decompresses the chunks it covers;
+- ``<run>.json``: parameters, objective values, scalars, horizon totals,
+  status, runtime, backend and any solver statistics.
+
+Queries read the small JSON files to select runs and then only the
+requested chunks, so comparing many scenarios never loads whole runs.
+"""
+import json
+import os
+import uuid
+
+import numpy as np
+
+from profiling import phase
+from results import Results
+
+store_folder = 'results_store'
+chunk_size = 96 * 7
+
+
+class ResultStore:
+    """Folder of runs saved by ``save`` and read back column by column."""
+
+    def __init__(self, folder=store_folder, chunk=chunk_size):
+        self.folder = folder
+        self.chunk = chunk
+        self._archives = {}
+
+    def path(self, run, suffix):
+        return os.path.join(self.folder, run + suffix)
+
+    def save(self, solution, params=None, run=None, **metadata):
+        """Write ``solution`` and return its run name (a random one by default).
+
+        ``params`` and any extra keyword arguments are stored as metadata.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        run = run or uuid.uuid4().hex[:12]
+        results = Results(solution)
+        layout = solution.layout
+        columns = {'%s.%s' % link: results[link] for link in layout.links}
+        columns['cum_sum'] = results.cum_sum
+        arrays = {}
+        for name, series in columns.items():
+            for k, start in enumerate(range(0, layout.end, self.chunk)):
+                arrays['%s/%d' % (name, k)] = series[start:start + self.chunk]
+        info = {
+            'run': run,
+            'end': layout.end,
+            'chunk': self.chunk,
+            'columns': list(columns),
+            'params': dict(params or {}),
+            'objective_values': solution.objective_values,
+            'scalars': {name: float(solution.scalar(name)) for name in layout.scalars},
+            'totals': results.totals(),
+            'status': solution.status,
+            'runtime': solution.runtime,
+            'backend': solution.backend,
+            'stats': solution.stats,
+        }
+        info.update(metadata)
+        # write under temporary names first so readers never see half a run
+        tmp = self.path(run, '.tmp')
+        with phase('save'):
+            np.savez_compressed(tmp + '.npz', **arrays)
+            with open(tmp + '.json', 'w') as file:
+                json.dump(info, file, default=float)
+            os.replace(tmp + '.npz', self.path(run, '.npz'))
+            os.replace(tmp + '.json', self.path(run, '.json'))
+        self._archives.pop(run, None)
+        return run
+
+    def runs(self, **params):
+        """Names of the stored runs whose parameters match ``params``."""
+        if not os.path.isdir(self.folder):
+            return []
+        names = sorted(name[:-5] for name in os.listdir(self.folder)
+                       if name.endswith('.json') and not name.endswith('.tmp.json'))
+        if not params:
+            return names
+        return [run for run in names
+                if all(self.metadata(run)['params'].get(key) == value for key, value in params.items())]
+
+    def metadata(self, run):
+        with open(self.path(run, '.json'), 'r') as file:
+            return json.load(file)
+
+    def table(self, runs=None):
+        """One flat row per run: name, parameters, objective values and status."""
+        rows = []
+        for run in self.runs() if runs is None else runs:
+            info = self.metadata(run)
+            row = {'run': run}
+            row.update(info['params'])
+            row.update(info['objective_values'])
+            row.update(status=info['status'], runtime=info['runtime'], backend=info['backend'])
+            rows.append(row)
+        return rows
+
+    def archive(self, run):
+        if run not in self._archives:
+            self._archives[run] = np.load(self.path(run, '.npz'))
+        return self._archives[run]
+
+    def load(self, run, column, start=0, stop=None):
+        """``column`` ('src.dst', a (src, dst) tuple or 'cum_sum') of ``run`` over ``[start, stop)``."""
+        if isinstance(column, tuple):
+            column = '%s.%s' % column
+        info = self.metadata(run)
+        stop = info['end'] if stop is None else min(stop, info['end'])
+        chunk = info['chunk']
+        archive = self.archive(run)
+        parts = [archive['%s/%d' % (column, k)] for k in range(start // chunk, (stop - 1) // chunk + 1)]
+        if not parts:
+            return np.zeros(0)
+        series = np.concatenate(parts)
+        offset = start // chunk * chunk
+        return series[start - offset:stop - offset]
+
+    def compare(self, column, runs=None, start=0, stop=None):
+        """``(n_runs, stop - start)`` matrix of one column across runs (equal horizons)."""
+        runs = self.runs() if runs is None else runs
+        return np.array([self.load(run, column, start, stop) for run in runs])
+
+    def close(self):
+        for archive in self._archives.values():
+            archive.close()
+        self._archives = {}
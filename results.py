@@ -0,0 +1,112 @@
+"""Bulk access to a solved energy_system model.
+
+The backends return every column value in a single call; Results reshapes
+the link part of that vector into a zero-copy ``(n_links, end)`` matrix and
+computes the derived series of the scenario scripts as array sums.
+
+The link lists below name links of topology.json. On a districts.py
+topology they match every district copy ('pv@d00' -> 'lv@d00', ...), and
+links the topology does not have are left out of the sums.
+"""
+import numpy as np
+
+SOURCES = [('pv', 'lv'), ('mv', 'lv'), ('lake', 'hp_lake'), ('mp', 'gas')]
+RENEWABLE = [('lake', 'hp_lake'), ('pv', 'lv')]
+POWER = [('lv', 'electricity_direct'), ('lv', 'hp_heat_ht'), ('lv', 'hp_cool_lt'),
+         ('lv', 'hp_lake'), ('lv', 'hp_heat_lt')]
+
+# annual totals written to reject_1.json by minimize_reject.py
+TOTALS = {
+    'pv': ('pv', 'lv'),
+    'mv': ('mv', 'lv'),
+    'lv_mv': ('lv', 'mv'),
+    'lv_hp_lake': ('lv', 'hp_lake'),
+    'lv_hp_heat_lt': ('lv', 'hp_heat_lt'),
+    'lv_hp_cool_lt': ('lv', 'hp_cool_lt'),
+    'lv_hp_heat_ht': ('lv', 'hp_heat_ht'),
+    'lv_electricity_direct': ('lv', 'electricity_direct'),
+    'lv_p2g': ('lv', 'p2g'),
+    'chp_ht': ('chp', 'ht_dhn'),
+    'chp_lv': ('chp', 'lv'),
+    'gas_ht': ('gas_b', 'ht_dhn'),
+    'gas_gas_b': ('gas', 'gas_b'),
+    'gas_chp': ('gas', 'chp'),
+    'gas_gas_direct': ('gas', 'gaz_direct'),
+    'mp': ('mp', 'gas'),
+    'lake': ('lake', 'hp_lake'),
+    'hp_lake_lt': ('hp_lake', 'lt_dhcn'),
+    'hp_cool_lt': ('hp_cool_lt', 'lt_dhcn'),
+    'lt_dhcn_hp_heat_lt': ('lt_dhcn', 'hp_heat_lt'),
+    'lt_dhcn_hp_heat_ht': ('lt_dhcn', 'hp_heat_ht'),
+    'lt_dhcn_reject': ('lt_dhcn', 'reject'),
+    'hp_heat_ht': ('hp_heat_ht', 'ht_dhn'),
+    'total_sources': SOURCES,
+    'renewable': RENEWABLE,
+    'sub': ('ht_dhn', 'sub'),
+}
+
+
+def base_name(node):
+    """Node name without the '@district' suffix of districts.py."""
+    return node.partition('@')[0]
+
+
+class Results:
+    """``(n_links, end)`` flow matrix of a backends.Solution indexed by (src, dst)."""
+
+    def __init__(self, solution):
+        layout = solution.layout
+        self.layout = layout
+        self.links = layout.links
+        self.flows = solution.x[:len(layout.links) * layout.end].reshape(len(layout.links), layout.end)
+        self.cum_sum = solution.x[layout.cum_sum]
+        self.objective_values = solution.objective_values
+        # links with the district suffix of their nodes removed
+        self.base_links = [(base_name(src), base_name(dst)) for src, dst in self.links]
+
+    def rows(self, links):
+        """Numbers of the links, or of their district copies, that are in the topology."""
+        links = set(links)
+        return np.array([k for k, link in enumerate(self.base_links) if link in links], dtype=np.int64)
+
+    def __getitem__(self, link):
+        return self.flows[self.layout.link_index[link]]
+
+    def series(self, links):
+        """Sum of the given links per timestep."""
+        return self.flows[self.rows(links)].sum(axis=0)
+
+    def inflow(self, node):
+        """Total flow entering ``node`` per timestep."""
+        return self.flows[self.layout.topology.incoming[node]].sum(axis=0)
+
+    def outflow(self, node):
+        """Total flow leaving ``node`` per timestep."""
+        return self.flows[self.layout.topology.outgoing[node]].sum(axis=0)
+
+    @property
+    def total_sources(self):
+        return self.series(SOURCES)
+
+    @property
+    def renewable(self):
+        return self.series(RENEWABLE)
+
+    @property
+    def power(self):
+        return self.series(POWER)
+
+    @property
+    def storage_cumsum(self):
+        """Storage level per timestep, the cum_sum columns (weighted and from the initial level)."""
+        return self.cum_sum
+
+    def totals(self):
+        """Horizon totals keyed like reject_1.json, weighted by timestep duration."""
+        link_totals = self.flows @ self.layout.weight()
+        totals = {}
+        for name, links in TOTALS.items():
+            if isinstance(links[0], str):
+                links = [links]
+            totals[name] = float(link_totals[self.rows(links)].sum())
+        return totals
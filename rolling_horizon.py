@@ -0,0 +1,132 @@
+"""Rolling-horizon solve of the energy_system model.
+
+The year is cut into windows of ``window`` timesteps, each solved with a
+look-ahead of ``overlap`` extra timesteps that are discarded afterwards.
+The gas storage level (``cum_sum``) reached at the end of the committed part
+is the initial level of the next window, the running max/min envelopes are
+folded in as constants, and only the last window has to bring the storage
+back to zero. Peak memory is bounded by the size of one window.
+
+Every window bounds its primary objective by its own optimum plus
+``rel_tol`` before solving the secondary one, so the tolerance is spent
+window by window: the stitched primary total can exceed the monolithic
+bound (131.9k against 118.8k * 1.1 over 4 weeks at pv_scale=3). With
+rel_tol=0 it matches the monolithic optimum.
+"""
+import time
+
+import numpy as np
+
+from backends import Solution, get_backend
+from model_builder import Layout, build_program, default_topology
+from topology import coefficient
+from profile_store import data_folder, load_profiles
+
+week = 96 * 7
+day = 96
+# statuses of a stitched solution, from best to worst
+STATUSES = ['optimal', 'time_limit', 'iteration_limit']
+
+
+class Window:
+    """Bounds, runtime, objective values and status of one solved window."""
+
+    def __init__(self, start, commit, stop, runtime, objective_values, status='optimal'):
+        self.start = start
+        self.commit = commit
+        self.stop = stop
+        self.runtime = runtime
+        self.objective_values = objective_values
+        self.status = status
+
+
+def worst_status(statuses):
+    """Status of a solution stitched from parts with the given statuses."""
+    return max(statuses, key=STATUSES.index)
+
+
+def envelope_constants(layout, x, stop):
+    """Value of every envelope term of the topology over the first ``stop`` timesteps of ``x``."""
+    if not stop:
+        return {}
+    constants = {}
+    for name, (kind, of) in layout.topology.envelopes.items():
+        series = x[layout.cum_sum if of == 'cum_sum' else layout.link(*of)][:stop]
+        constants[name] = float(series.max() if kind == 'max' else series.min())
+    return constants
+
+
+def stitched_solution(layout, x, params, secondary, runtime, backend, status='optimal'):
+    """Solution over ``layout`` whose scalars and objective values are
+    recomputed from the link and cum_sum values of ``x``."""
+    topology = layout.topology
+    flows = x[:len(layout.links) * layout.end].reshape(len(layout.links), layout.end)
+    scalars = envelope_constants(layout, x, layout.end)
+    link_totals = flows.sum(axis=1)
+    for name, terms in topology.totals.items():
+        ids = topology.link_ids([link for link, _ in terms])
+        coefs = np.array([coefficient(coef, params) for _, coef in terms])
+        scalars[name] = float(coefs @ link_totals[ids])
+    for name, value in scalars.items():
+        x[layout.scalars[name]] = value
+    primary = topology.primary
+    objective_values = {
+        primary['name']: sum(coef * scalars[name] for name, coef in primary['terms'].items()),
+        secondary: sum(coef * scalars[name] for name, coef in topology.secondary[secondary].items()),
+    }
+    return Solution(layout, x, objective_values, status, runtime, backend)
+
+
+def rolling_solve(profiles, end=None, window=week, overlap=day, params=None, secondary='storage',
+                  envelope='auto', topology=None, backend=None, **options):
+    """Solve ``profiles[:end]`` window by window and stitch the link series.
+
+    Returns a backends.Solution over the full horizon whose scalars
+    (ext_feeder, rejects, envelopes) are recomputed from the stitched
+    series; ``solution.windows`` lists the individual solves. The status is
+    the worst of the windows: 'time_limit' when one of them stopped at the
+    time limit.
+    """
+    topology = topology or default_topology
+    params = dict(topology.params, **(params or {}))
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    layout = Layout(end, topology)
+    x = np.zeros(layout.n_cols)
+    flows = x[:len(layout.links) * end].reshape(len(layout.links), end)
+    cum_sum = x[layout.cum_sum]
+
+    start_time = time.perf_counter()
+    windows = []
+    start = 0
+    initial_storage = 0.0
+    while start < end:
+        stop = min(start + window + overlap, end)
+        commit = stop if stop == end else start + window
+        program = build_program({name: series[start:stop] for name, series in profiles.items()},
+                                stop - start, params, secondary,
+                                initial_storage=initial_storage,
+                                final_storage=0.0 if stop == end else None,
+                                envelope_constants=envelope_constants(layout, x, start),
+                                envelope=envelope, topology=topology)
+        part = get_backend(backend, **options).solve(program)
+
+        n = commit - start
+        part_flows = part.x[:len(layout.links) * (stop - start)].reshape(len(layout.links), stop - start)
+        flows[:, start:commit] = part_flows[:, :n]
+        cum_sum[start:commit] = part.cum_sum[:n]
+        initial_storage = cum_sum[commit - 1]
+        windows.append(Window(start, commit, stop, part.runtime, part.objective_values, part.status))
+        start = commit
+
+    solution = stitched_solution(layout, x, params, secondary, time.perf_counter() - start_time, part.backend,
+                                 worst_status(window.status for window in windows))
+    solution.windows = windows
+    return solution
+
+
+if __name__ == '__main__':
+    end = 35121
+    solution = rolling_solve(load_profiles(data_folder, end), end, secondary='rejects')
+    print(solution.objective_values)
+    print('%d windows in %.1f s' % (len(solution.windows), solution.runtime))
@@ -0,0 +1,197 @@
+"""On-disk cache of solved scenarios keyed by a hash of their inputs.
+
+The key is the sha256 of everything that determines a solution: the
+profile values the topology uses (cut to the horizon), the horizon, the
+full parameter dict, the secondary objective, the envelope formulation, the
+topology spec, the backend and the solver options that change results
+(``verbose`` and ``presolve_stats`` do not), plus the source of the
+modules that build and solve the model, so code changes invalidate old
+entries. A hit skips building and solving: the column vector is read back
+from ``<key>.npy`` and the objective values, status and statistics from
+``<key>.json``. Entries are evicted least recently used first once the
+cache exceeds ``max_bytes`` or ``max_entries``.
+
+    solution = cached_solve(profiles, end, secondary='rejects')
+    solution.cached  # True when it came from the cache
+
+    python scenario_cache.py --max-mb 500
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from backends import Solution, get_backend
+from model_builder import Layout, build_program, default_topology
+from profiling import phase
+
+cache_folder = 'scenario_cache'
+# options that do not change the solution
+NEUTRAL_OPTIONS = {'verbose', 'presolve_stats'}
+CODE_FILES = ['model_builder.py', 'topology.py', 'backends.py']
+_code_digest = None
+
+
+def code_digest():
+    """Hash of the modules that build and solve the model."""
+    global _code_digest
+    if _code_digest is None:
+        digest = hashlib.sha256()
+        folder = os.path.dirname(os.path.abspath(__file__))
+        for name in CODE_FILES:
+            with open(os.path.join(folder, name), 'rb') as file:
+                digest.update(file.read())
+        _code_digest = digest.hexdigest()
+    return _code_digest
+
+
+def scenario_key(profiles, end, params=None, secondary='storage', envelope='auto', topology=None, backend=None,
+                 **options):
+    """Hex digest of the normalized inputs of a solve."""
+    topology = topology or default_topology
+    params = {name: float(value) if isinstance(value, (int, float)) else value
+              for name, value in dict(topology.params, **(params or {})).items()}
+    header = {
+        'end': int(end),
+        'params': params,
+        'secondary': secondary,
+        'envelope': envelope,
+        'topology': topology.digest,
+        'backend': backend,
+        'options': {name: value for name, value in options.items() if name not in NEUTRAL_OPTIONS},
+        'code': code_digest(),
+    }
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True, default=str).encode())
+    for name in sorted({equation.profile for equation in topology.equations if equation.profile is not None}):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(profiles[name][:end], dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class ScenarioCache:
+    """Folder of solutions by scenario key, with least recently used eviction."""
+
+    def __init__(self, folder=cache_folder, max_bytes=2 * 1024 ** 3, max_entries=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def path(self, key, suffix):
+        return os.path.join(self.folder, key + suffix)
+
+    def get(self, key, topology=None):
+        """Cached Solution of ``key``, or None."""
+        if not (os.path.exists(self.path(key, '.json')) and os.path.exists(self.path(key, '.npy'))):
+            return None
+        with open(self.path(key, '.json'), 'r') as file:
+            info = json.load(file)
+        x = np.load(self.path(key, '.npy'))
+        os.utime(self.path(key, '.npy'))  # mark as recently used
+        layout = Layout(info['end'], topology)
+        return Solution(layout, x, info['objective_values'], info['status'], info['runtime'], info['backend'],
+                        info['stats'])
+
+    def put(self, key, solution):
+        os.makedirs(self.folder, exist_ok=True)
+        info = {
+            'end': solution.layout.end,
+            'objective_values': solution.objective_values,
+            'status': solution.status,
+            'runtime': solution.runtime,
+            'backend': solution.backend,
+            'stats': solution.stats,
+        }
+        # write under temporary names first so readers never see half an entry
+        tmp = self.path(key, '.tmp')
+        np.save(tmp + '.npy', solution.x)
+        with open(tmp + '.json', 'w') as file:
+            json.dump(info, file, default=float)
+        os.replace(tmp + '.npy', self.path(key, '.npy'))
+        os.replace(tmp + '.json', self.path(key, '.json'))
+        self.evict()
+
+    def entries(self):
+        """``(last use, size, key)`` of every entry, least recently used first."""
+        if not os.path.isdir(self.folder):
+            return []
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                continue
+            key = name[:-4]
+            try:
+                stat = os.stat(self.path(key, '.npy'))
+                size = stat.st_size + os.path.getsize(self.path(key, '.json'))
+            except OSError:
+                continue  # evicted by another process meanwhile
+            entries.append((stat.st_mtime, size, key))
+        return sorted(entries)
+
+    def evict(self):
+        """Remove least recently used entries until the size and count limits hold."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes
+                           or (self.max_entries is not None and len(entries) > self.max_entries)):
+            _, size, key = entries.pop(0)
+            for suffix in ('.json', '.npy'):
+                try:
+                    os.remove(self.path(key, suffix))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        self.max_entries, limit = 0, self.max_entries
+        self.evict()
+        self.max_entries = limit
+
+
+def cached_solve(profiles, end=None, params=None, secondary='storage', envelope='auto', topology=None, backend=None,
+                 cache=None, **options):
+    """build_program + solve, unless the same scenario is in ``cache`` (a ScenarioCache or folder).
+
+    The returned Solution has ``cached`` set to whether it came from the cache.
+    """
+    topology = topology or default_topology
+    if end is None:
+        end = min(len(series) for series in profiles.values())
+    if not isinstance(cache, ScenarioCache):
+        cache = ScenarioCache(cache or cache_folder)
+    if backend is None:
+        backend = get_backend().name
+    with phase('cache_lookup'):
+        key = scenario_key(profiles, end, params, secondary, envelope, topology, backend, **options)
+        solution = cache.get(key, topology)
+    if solution is not None:
+        solution.cached = True
+        return solution
+    program = build_program(profiles, end, params, secondary, envelope=envelope, topology=topology)
+    solution = get_backend(backend, **options).solve(program)
+    with phase('cache_store'):
+        cache.put(key, solution)
+    solution.cached = False
+    return solution
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--folder', default=cache_folder)
+    parser.add_argument('--max-mb', type=float, help='evict down to this size')
+    parser.add_argument('--max-entries', type=int, help='evict down to this number of entries')
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    cache = ScenarioCache(args.folder, max_entries=args.max_entries)
+    if args.max_mb is not None:
+        cache.max_bytes = args.max_mb * 1024 ** 2
+    if args.clear:
+        cache.clear()
+    cache.evict()
+    entries = cache.entries()
+    for used, size, key in entries:
+        print(key[:16], time.strftime('%Y-%m-%d %H:%M', time.localtime(used)), '%.1f MB' % (size / 1024 ** 2))
+    print('%d entries, %.1f MB' % (len(entries), sum(size for _, size, _ in entries) / 1024 ** 2))
@@ -0,0 +1,126 @@
+"""Parallel scenario sweep over a parameter grid.
+
+Every combination of the grid values (any DEFAULT_PARAMS key, e.g. t_res_1,
+t_lake, r_p2g, pv_scale, tariff_mv, tariff_mp) is built and solved in a
+worker process with a bounded number of solver threads, and all runs end up
+in one CSV table of parameters, objective values and annual totals.
+
+    python sweep.py grid.json --end 2688 --workers 8 --output sweep.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import solve
+from model_builder import DEFAULT_PARAMS, build_program
+from persistent import PersistentModel
+from profile_store import data_folder, load_profiles
+from result_store import ResultStore
+from results import Results
+
+_profiles = None
+_model = None
+
+
+def expand_grid(grid):
+    """List of parameter dicts, one per combination of the grid values."""
+    unknown = set(grid) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError('unknown sweep parameters: %s' % ', '.join(sorted(unknown)))
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _init_worker(folder, end):
+    global _profiles
+    _profiles = load_profiles(folder, end)
+
+
+def _solve_reused(params, end, secondary, backend, threads):
+    # update the worker's model in place and warm start from its previous scenario
+    global _model
+    key = (end, secondary, backend, threads)
+    if _model is None or _model.key != key:
+        _model = PersistentModel(_profiles, end, params, secondary, backend=backend, threads=threads)
+        _model.key = key
+    else:
+        _model.update(dict(DEFAULT_PARAMS, **params))
+    return _model.solve()
+
+
+def run_scenario(params, end, secondary='storage', backend=None, threads=1, reuse=True, store=None):
+    """Build and solve one scenario, returning a flat result row.
+
+    With ``reuse`` the worker keeps its model loaded between scenarios and
+    only pushes the changed coefficients and right-hand sides. With a
+    ``store`` folder the full time series are saved there (see
+    result_store.py) and the row gets the run name.
+    """
+    global _model
+    row = dict(params)
+    start = time.perf_counter()
+    try:
+        if reuse:
+            solution = _solve_reused(params, end, secondary, backend, threads)
+        else:
+            solution = solve(build_program(_profiles, end, params, secondary), backend, threads=threads)
+    except Exception as error:
+        _model = None  # a failed update may leave the loaded model half changed
+        row['status'] = 'error: %s' % error
+        return row
+    row['status'] = solution.status
+    row['backend'] = solution.backend
+    row['solve_time'] = solution.runtime
+    row['total_time'] = time.perf_counter() - start
+    row.update(solution.objective_values)
+    row.update(Results(solution).totals())
+    if store is not None:
+        row['run'] = ResultStore(store).save(solution, params, secondary=secondary)
+    return row
+
+
+def run_sweep(grid, end, secondary='storage', folder=data_folder, workers=None, threads=1,
+              backend=None, output='sweep_results.csv', reuse=True, store=None):
+    """Solve every grid point on a process pool and write one CSV table."""
+    scenarios = expand_grid(grid)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads)
+    load_profiles(folder, end)  # build the profile store once, before the workers map it
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(folder, end)) as pool:
+        futures = [pool.submit(run_scenario, params, end, secondary, backend, threads, reuse, store)
+                   for params in scenarios]
+        rows = [future.result() for future in futures]
+
+    columns = []
+    for row in rows:
+        columns += [name for name in row if name not in columns]
+    with open(output, 'w', newline='') as file:
+        writer = csv.DictWriter(file, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('grid', help='JSON file mapping parameter names to lists of values')
+    parser.add_argument('--end', type=int, default=35121)
+    parser.add_argument('--secondary', default='storage')
+    parser.add_argument('--folder', default=data_folder)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threads', type=int, default=1, help='solver threads per worker')
+    parser.add_argument('--backend')
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--no-reuse', dest='reuse', action='store_false',
+                        help='rebuild and cold-start the model for every scenario')
+    parser.add_argument('--store', help='folder where the time series of every scenario are saved')
+    args = parser.parse_args()
+    with open(args.grid, 'r') as file:
+        grid = json.load(file)
+    rows = run_sweep(grid, args.end, args.secondary, args.folder, args.workers, args.threads,
+                     args.backend, args.output, args.reuse, args.store)
+    print('%d scenarios written to %s' % (len(rows), args.output))
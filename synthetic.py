@@ -0,0 +1,147 @@
+"""Seeded synthetic profils series, for benchmarks and stress tests without data.
+
+The six series follow the shapes of the real ones: heating needs peak in
+winter mornings and evenings, cooling needs in summer afternoons, PV
+production follows daylight and the season under random cloud cover and
+electricity needs have a day/night cycle. Day-to-day weather is smoothed
+noise, so consecutive timesteps are correlated as in measured data, and a
+slower anomaly makes every winter of a multi-year series different.
+
+Any length and resolution are accepted (``steps_per_day``, 96 for the
+quarter hours of the profils files). ``site_profiles`` draws many sites of
+different sizes and PV capacities sharing one regional weather, and
+``write_sites`` writes them as profile stores, one folder per site, that
+``load_profiles(folder)`` reads like the real data:
+
+    python synthetic.py synthetic_sites --sites 16 --years 3 --resolution 15
+"""
+import argparse
+import os
+
+import numpy as np
+from scipy.signal import lfilter
+
+from profile_store import PROFILE_FILES, ProfileStore
+
+day = 96
+year_days = 365
+
+# approximate peak of each series, in the units of the profils files
+PEAKS = {
+    'cooling_needs': 4000.0,
+    'heating_needs_gas': 4500.0,
+    'heating_needs_net': 6000.0,
+    'solar_prod': 60.0,
+    'sub_need': 3800.0,
+    'electricity_need': 7000.0,
+}
+
+
+def horizon(years=1, steps_per_day=day):
+    """Length of ``years`` of data, closing point included (35041 for 365 days of quarter hours)."""
+    return int(round(years * year_days * steps_per_day)) + 1
+
+
+def smooth_noise(rng, length, correlation, scale):
+    """AR(1) noise with lag-one ``correlation`` and stationary deviation ``scale``."""
+    white = rng.standard_normal(length) * scale * np.sqrt(1 - correlation ** 2)
+    return lfilter([1.0], [1.0, -correlation], white)
+
+
+def regional_weather(rng, length, steps_per_day=day):
+    """Temperature anomaly and cloud cover shared by the sites of a region."""
+    daily = smooth_noise(rng, length, 1 - 1.0 / steps_per_day, 0.15)
+    # month-scale anomaly: mild and harsh winters
+    monthly = smooth_noise(rng, length, 1 - 1.0 / (30 * steps_per_day), 0.1)
+    clouds = np.abs(smooth_noise(rng, length, 1 - 4.0 / steps_per_day, 0.4))
+    return {'anomaly': daily + monthly, 'clouds': clouds}
+
+
+def synthetic_profiles(length=35121, seed=0, steps_per_day=day, weather=None, scale=1.0, pv_scale=1.0):
+    """Dict of the six profile series, ``length`` timesteps starting on January 1st.
+
+    ``weather`` (see regional_weather) is drawn from ``seed`` when not
+    given; the needs are multiplied by ``scale`` and the PV production by
+    ``pv_scale``.
+    """
+    rng = np.random.default_rng(seed)
+    if weather is None:
+        weather = regional_weather(rng, length, steps_per_day)
+    # local deviation around the regional weather
+    anomaly = weather['anomaly'] + smooth_noise(rng, length, 1 - 1.0 / steps_per_day, 0.05)
+    clouds = np.clip(1 - weather['clouds'], 0.1, 1.0)
+    t = np.arange(length)
+    hour = (t % steps_per_day) * 24.0 / steps_per_day
+    season = np.cos(2 * np.pi * t / (steps_per_day * year_days))  # 1 in January, -1 in July
+    winter = 0.5 * (1 + season)
+    summer = 1 - winter
+    twice_daily = np.exp(-((hour - 7) / 2) ** 2) + 0.8 * np.exp(-((hour - 19) / 3) ** 2)
+    afternoon = np.exp(-((hour - 15) / 4) ** 2)
+
+    heating = np.clip(winter * (0.6 + 0.4 * twice_daily) - anomaly, 0.05, None)
+    cooling = np.clip(summer ** 2 * (0.3 + 0.7 * afternoon) + anomaly, 0.0, None)
+    daylight = np.clip(np.sin(np.pi * (hour - 12 + 6 + 2 * summer) / (12 + 4 * summer)), 0.0, None)
+    electricity = 0.6 + 0.3 * np.exp(-((hour - 13) / 5) ** 2) + 0.1 * winter
+
+    shapes = {
+        'cooling_needs': cooling,
+        'heating_needs_gas': heating * (0.9 + 0.1 * rng.random(length)),
+        'heating_needs_net': heating,
+        'solar_prod': daylight * (0.4 + 0.6 * summer) * clouds,
+        'sub_need': 0.2 + 0.8 * heating,
+        'electricity_need': electricity * (1 + smooth_noise(rng, length, 0.9, 0.05)),
+    }
+    factors = {name: scale for name in shapes}
+    factors['solar_prod'] = pv_scale
+    # normalized on the first year, so later years keep their own anomalies
+    reference = slice(0, min(length, horizon(1, steps_per_day)))
+    return {name: factors[name] * PEAKS[name] * np.clip(shape, 0.0, None) / max(shape[reference].max(), 1e-12)
+            for name, shape in shapes.items()}
+
+
+def site_profiles(sites, length=35121, seed=0, steps_per_day=day):
+    """List of ``sites`` profile dicts sharing one regional weather.
+
+    Sites differ by size (needs scaled by a lognormal factor), PV capacity
+    and their local weather deviation.
+    """
+    sequence = np.random.SeedSequence(seed)
+    region, sizes, *children = sequence.spawn(sites + 2)
+    weather = regional_weather(np.random.default_rng(region), length, steps_per_day)
+    draws = np.random.default_rng(sizes).random((sites, 2))
+    return [synthetic_profiles(length, child, steps_per_day, weather,
+                               scale=float(np.exp(draws[k, 0] - 0.5)), pv_scale=float(0.5 + 2 * draws[k, 1]))
+            for k, child in enumerate(children)]
+
+
+def write_store(profiles, folder, tag='synthetic'):
+    """Write ``profiles`` as the profile store of ``folder`` (load_profiles(folder) reads it back)."""
+    if any(os.path.exists(os.path.join(folder, name)) for name in PROFILE_FILES.values()):
+        raise ValueError('%s holds profils JSON files, refusing to shadow them with synthetic data' % folder)
+    ProfileStore(folder).write(profiles, {name: tag for name in profiles})
+    return folder
+
+
+def write_sites(folder, sites=1, years=1, steps_per_day=day, seed=0):
+    """Generate and store ``sites`` sites of ``years`` years in ``folder/site_<k>``; return the folders."""
+    length = horizon(years, steps_per_day)
+    folders = []
+    for k, profiles in enumerate(site_profiles(sites, length, seed, steps_per_day)):
+        tag = 'synthetic seed=%d site=%d steps_per_day=%d' % (seed, k, steps_per_day)
+        folders.append(write_store(profiles, os.path.join(folder, 'site_%03d' % k), tag))
+    return folders
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder', nargs='?', default='synthetic_sites')
+    parser.add_argument('--sites', type=int, default=1)
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--resolution', type=int, default=15, help='timestep in minutes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if (24 * 60) % args.resolution:
+        parser.error('the resolution must divide a day')
+    folders = write_sites(args.folder, args.sites, args.years, 24 * 60 // args.resolution, args.seed)
+    print('%d sites of %d timesteps written to %s' % (len(folders), horizon(args.years, 24 * 60 // args.resolution),
+                                                      args.folder))
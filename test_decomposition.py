@@ -0,0 +1,31 @@
+"""Benders decomposition against the monolithic optimum on synthetic profiles."""
+import pytest
+
+from backends import get_backend
+from decomposition import decomposed_solve
+from model_builder import build_program
+
+# with more PV the gas storage moves and the boundary levels matter
+PARAMS = {'pv_scale': 3}
+period = 16
+
+
+@pytest.mark.parametrize('secondary', ['rejects', 'storage'])
+def test_matches_monolithic(profiles, end, backend, secondary):
+    monolithic = get_backend(backend).solve(build_program(profiles, end, PARAMS, secondary))
+    solution = decomposed_solve(profiles, end, period, PARAMS, secondary, workers=1, backend=backend)
+    assert solution.status == 'optimal'
+    assert len(solution.levels) == end // period + 1
+    # first stage: primary optimum, second stage: secondary optimum within the primary bound
+    assert solution.bounds[-1][1] == pytest.approx(monolithic.stats['Ext_feeder']['optimum'], rel=1e-6)
+    assert solution.objective_values[secondary] == pytest.approx(monolithic.objective_values[secondary],
+                                                                 rel=1e-6, abs=1e-6)
+    assert solution.objective_values['Ext_feeder'] <= monolithic.stats['Ext_feeder']['optimum'] * 1.1 + 1e-6
+
+
+def test_iteration_limit_is_reported(profiles, end, backend):
+    solution = decomposed_solve(profiles, end, period, PARAMS, 'rejects', workers=1, backend=backend,
+                                max_iterations=2)
+    lower, upper = solution.bounds[-1]
+    assert upper - lower > 1.0
+    assert solution.status == 'iteration_limit'
@@ -0,0 +1,18 @@
+"""Tests of the multi-district topology on synthetic profiles."""
+import pytest
+
+from backends import get_backend
+from districts import build_districts
+from result_store import ResultStore
+from results import Results
+
+
+def test_save_two_districts(profiles, end, backend, tmp_path):
+    solution = get_backend(backend).solve(build_districts([profiles, profiles], end, envelope='lp'))
+    totals = Results(solution).totals()
+    # both districts have the same pv production, summed over their copies of pv -> lv
+    assert totals['pv'] == pytest.approx(2 * float(profiles['solar_prod'][:end].sum()) * 0.1)
+
+    store = ResultStore(str(tmp_path))
+    run = store.save(solution)
+    assert store.metadata(run)['totals'] == pytest.approx(totals)
@@ -0,0 +1,73 @@
+"""Tests of the model builder and the LP backends.
+
+They run on 48 timesteps of seeded synthetic profiles (see conftest.py)
+with HiGHS (highspy or scipy); the comparison with Gurobi general
+constraints is skipped when no Gurobi license starts.
+
+    python -m pytest -q test_model.py
+"""
+import numpy as np
+import pytest
+
+from backends import check_envelopes, get_backend
+from model_builder import build_program
+from results import Results
+from topology import coefficient, cop_cool
+
+# with more PV the gas storage moves and its envelope is not trivial
+STORAGE_PARAMS = {'pv_scale': 3}
+
+
+def test_coefficient_expressions():
+    params = {'r_p2g': 0.6, 't_res_1': 12, 't_cool': 6}
+    assert coefficient('-r_p2g', params) == -0.6
+    assert coefficient('(1 + 1 / cop_cool(t_res_1, t_cool)) / 1000', params) == (1 + 1 / cop_cool(12, 6)) / 1000
+    for expr in ('__import__("os")', 'r_p2g.real', '2 ** 3', 'unknown'):
+        with pytest.raises(ValueError):
+            coefficient(expr, params)
+
+
+def test_baseline_objective(profiles, end, backend):
+    solution = get_backend(backend).solve(build_program(profiles, end, secondary='rejects'))
+    assert solution.status == 'optimal'
+    assert solution.stats['Ext_feeder']['optimum'] == pytest.approx(7308.18, abs=0.01)
+    # the reported values are those of the returned solution, within rel_tol of the stage optimum
+    assert solution.objective_values['Ext_feeder'] == pytest.approx(solution.scalar('ext_feeder'))
+    assert solution.objective_values['Ext_feeder'] <= 7308.18 * (1 + 0.1) + 0.01
+
+
+def test_epigraph_envelopes_are_exact(profiles, end, backend):
+    program = build_program(profiles, end, STORAGE_PARAMS, secondary='storage', envelope='lp')
+    assert not program.general
+    solution = get_backend(backend).solve(program)
+    cum_sum = solution.cum_sum
+    assert np.ptp(cum_sum) > 1.0
+    assert solution.scalar('value_max') == pytest.approx(cum_sum.max(), abs=1e-6)
+    assert solution.scalar('value_min') == pytest.approx(cum_sum.min(), abs=1e-6)
+    assert solution.objective_values['storage'] == pytest.approx(np.ptp(cum_sum), abs=1e-6)
+
+
+def test_auto_envelope_formulation(profiles, end):
+    # minimizing a max is an epigraph, minimizing a min needs a general constraint
+    assert not build_program(profiles, end, secondary='storage').general
+    assert build_program(profiles, end, secondary='mv_min').general
+    with pytest.raises(ValueError):
+        build_program(profiles, end, secondary='mv_min', envelope='lp')
+
+
+def test_envelopes_match_general_constraints(profiles, end):
+    gurobipy = pytest.importorskip('gurobipy')
+    try:
+        values = check_envelopes(profiles, end, 'storage', STORAGE_PARAMS)
+    except gurobipy.GurobiError as error:
+        pytest.skip(str(error))
+    assert values['lp']['storage'] > 1.0
+
+
+def test_storage_cumsum_is_weighted(profiles, end, backend):
+    weights = np.full(end, 2.0)
+    program = build_program(profiles, end, STORAGE_PARAMS, initial_storage=5.0, final_storage=None,
+                            weights=weights)
+    results = Results(get_backend(backend).solve(program))
+    expected = 5.0 + np.cumsum(weights * results['gas_storage', 'gas'])
+    np.testing.assert_allclose(results.storage_cumsum, expected, atol=1e-6)
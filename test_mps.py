@@ -0,0 +1,29 @@
+"""Round trip of a program through write_mps, HiGHS and read_sol."""
+import numpy as np
+import pytest
+
+from backends import get_backend
+from model_builder import build_program
+from mps import read_sol, write_mps
+
+
+def test_mps_round_trip(profiles, end, backend, tmp_path):
+    highspy = pytest.importorskip('highspy')
+    program = build_program(profiles, end, secondary='rejects', envelope='lp')
+    optimum = get_backend(backend).solve(program).stats['Ext_feeder']['optimum']
+
+    path = str(tmp_path / 'model.mps.gz')
+    write_mps(program, path)
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    h.readModel(path)
+    lp = h.getLp()
+    assert (lp.num_col_, lp.num_row_) == (program.n_cols, program.n_rows)
+    h.run()
+    assert h.getInfo().objective_function_value == pytest.approx(optimum)
+
+    sol = str(tmp_path / 'model.sol')
+    h.writeSolution(sol, 0)
+    read = read_sol(sol, program)
+    assert read.objective_values['Ext_feeder'] == pytest.approx(optimum)
+    np.testing.assert_allclose(read.link('pv', 'lv'), profiles['solar_prod'][:end] * 0.1)
@@ -0,0 +1,34 @@
+"""PersistentModel updates against a fresh build of the same variant."""
+import pytest
+
+from backends import get_backend
+from model_builder import build_program
+from persistent import PersistentModel
+
+PARAMS = {'pv_scale': 3, 't_res_1': 14}
+
+
+def assert_same_optimum(solution, fresh):
+    for name, stats in fresh.stats.items():
+        if isinstance(stats, dict):
+            assert solution.stats[name]['optimum'] == pytest.approx(stats['optimum'], rel=1e-6, abs=1e-6)
+
+
+def test_update_matches_fresh_build(profiles, end, backend):
+    model = PersistentModel(profiles, end, secondary='rejects', backend=backend)
+    model.solve()
+    assert model.update(PARAMS) > 0
+    fresh = get_backend(backend).solve(build_program(profiles, end, PARAMS, 'rejects'))
+    assert_same_optimum(model.solve(), fresh)
+
+    brighter = dict(profiles, solar_prod=profiles['solar_prod'] * 1.5)
+    assert model.update(profiles=brighter) > 0
+    fresh = get_backend(backend).solve(build_program(brighter, end, PARAMS, 'rejects'))
+    assert_same_optimum(model.solve(), fresh)
+
+
+def test_update_refuses_structure_changes(profiles, end, backend):
+    model = PersistentModel(profiles, end, secondary='rejects', backend=backend)
+    model.secondary = 'storage'
+    with pytest.raises(ValueError):
+        model.update()
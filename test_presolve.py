@@ -0,0 +1,22 @@
+"""Tests of the builder presolve: profile-fixed links substituted as constants."""
+import numpy as np
+import pytest
+
+from backends import get_backend
+from model_builder import build_program
+
+
+def test_presolve_round_trip(profiles, end, backend):
+    program = build_program(profiles, end, secondary='rejects')
+    layout = program.layout
+    assert layout.fixed and layout.n_cols < layout.full.n_cols
+    x = np.random.default_rng(0).random(layout.n_cols)
+    np.testing.assert_array_equal(layout.restrict(layout.expand(x)), x)
+
+    solution = get_backend(backend).solve(program)
+    assert solution.layout.n_cols == layout.full.n_cols
+    np.testing.assert_allclose(solution.link('pv', 'lv'), profiles['solar_prod'][:end] * 0.1)
+    unreduced = get_backend(backend).solve(build_program(profiles, end, secondary='rejects', presolve=False))
+    for objective in program.objectives:
+        assert solution.stats[objective.name]['optimum'] == pytest.approx(
+            unreduced.stats[objective.name]['optimum'], rel=1e-6, abs=1e-6)
@@ -0,0 +1,38 @@
+"""Rolling-horizon solves against the monolithic optimum on synthetic profiles."""
+import pytest
+
+from backends import get_backend
+from model_builder import build_program
+from rolling_horizon import rolling_solve
+
+# the monolithic hierarchy reaches the primary optimum exactly
+PARAMS = {'rel_tol': 0.0}
+
+
+def test_single_window_matches_monolithic(profiles, end, backend):
+    monolithic = get_backend(backend).solve(build_program(profiles, end, PARAMS, 'rejects'))
+    rolling = rolling_solve(profiles, end, window=end, params=PARAMS, secondary='rejects', backend=backend)
+    assert len(rolling.windows) == 1
+    for name, value in monolithic.objective_values.items():
+        assert rolling.objective_values[name] == pytest.approx(value, rel=1e-6, abs=1e-6)
+
+
+def test_windows_stay_close_to_monolithic(profiles, end, backend):
+    monolithic = get_backend(backend).solve(build_program(profiles, end, PARAMS, 'rejects'))
+    rolling = rolling_solve(profiles, end, window=16, overlap=8, params=PARAMS, secondary='rejects',
+                            backend=backend)
+    assert len(rolling.windows) == 3
+    assert rolling.status == 'optimal'
+    optimum = monolithic.objective_values['Ext_feeder']
+    # the windows only see their look-ahead, so the stitched total can only be worse
+    assert optimum - 1e-6 <= rolling.objective_values['Ext_feeder'] <= optimum * (1 + 1e-3)
+    assert rolling.scalar('ext_feeder') == pytest.approx(rolling.objective_values['Ext_feeder'])
+
+
+def test_time_limit_window_is_reported(profiles, end, backend, monkeypatch):
+    solver = type(get_backend(backend))
+    optimize = solver.optimize
+    monkeypatch.setattr(solver, 'optimize', lambda self: ('time_limit', optimize(self)[1]))
+    rolling = rolling_solve(profiles, end, window=16, overlap=8, params=PARAMS, secondary='rejects',
+                            backend=backend)
+    assert rolling.status == 'time_limit'
@@ -0,0 +1,46 @@
+"""Hits, misses and eviction of the scenario cache."""
+import os
+
+import numpy as np
+import pytest
+
+from backends import get_backend
+from model_builder import build_program
+from scenario_cache import ScenarioCache, cached_solve
+
+
+def test_hit_returns_the_stored_solution(profiles, end, backend, tmp_path):
+    cache = ScenarioCache(str(tmp_path))
+    first = cached_solve(profiles, end, secondary='rejects', backend=backend, cache=cache)
+    assert not first.cached
+    fresh = get_backend(backend).solve(build_program(profiles, end, secondary='rejects'))
+    assert first.objective_values == pytest.approx(fresh.objective_values)
+
+    # verbose does not change the solution, so it does not change the key
+    hit = cached_solve(profiles, end, secondary='rejects', backend=backend, cache=cache, verbose=False)
+    assert hit.cached
+    np.testing.assert_array_equal(hit.x, first.x)
+    assert hit.objective_values == first.objective_values
+    assert hit.status == first.status
+
+    for changed in ({'params': {'pv_scale': 3}}, {'secondary': 'storage'}, {'end': end - 1}):
+        options = dict({'end': end, 'secondary': 'rejects'}, **changed)
+        assert not cached_solve(profiles, backend=backend, cache=cache, **options).cached
+    assert len(cache.entries()) == 4
+
+
+def test_eviction_removes_least_recently_used(profiles, end, backend, tmp_path):
+    cache = ScenarioCache(str(tmp_path))
+    for pv_scale in (1, 2, 3):
+        cached_solve(profiles, end, {'pv_scale': pv_scale}, 'rejects', backend=backend, cache=cache)
+    # age the entries in the order they were written, then use the oldest one
+    for age, (_, _, key) in enumerate(reversed(cache.entries())):
+        os.utime(cache.path(key, '.npy'), (1e9 - age, 1e9 - age))
+    oldest = cache.entries()[0][2]
+    assert cache.get(oldest) is not None
+
+    cache.max_entries = 2
+    cache.evict()
+    keys = [key for _, _, key in cache.entries()]
+    assert len(keys) == 2 and oldest in keys
+    assert cache.get(oldest) is not None
@@ -0,0 +1,198 @@
+"""Declarative network topology compiled into a reusable model template.
+
+topology.json describes the energy_system network: parameters, profile
+bindings to the profils files, hubs, links with their bounds, the storage
+link, the linear equations (each one optionally equal to a profile times a
+factor), the max/min envelope terms, the totals and the objectives. A YAML
+file with the same keys can be used when PyYAML is installed. Coefficients
+and factors are numbers or expressions over the parameters, ``cop_heat``
+and ``cop_cool``.
+
+A Topology is compiled once per file: link indices and hub incidence are
+resolved at load time and the sparse row structure of every equation is
+cached per horizon length, so runs only fill in coefficient values. The
+incoming and outgoing link numbers of every node are integer arrays, used
+for the hub balances and for reading node flows out of a solution.
+"""
+import ast
+import hashlib
+import json
+import operator
+import os
+
+import numpy as np
+
+default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topology.json')
+
+
+# COP for heating heat pump computing
+def cop_heat(t_con, t_eva):
+    return 0.4 * (t_con + 273.15) / (t_con - t_eva)
+
+
+# COP for cooling heating pump computing
+def cop_cool(t_con, t_eva):
+    return 0.4 * (t_eva + 273.15) / (t_con - t_eva)
+
+
+FUNCTIONS = {'cop_heat': cop_heat, 'cop_cool': cop_cool}
+
+
+OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+def _evaluate(node, params):
+    """Value of an expression node; only numbers, parameters, + - * / and FUNCTIONS calls are allowed."""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, params)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id not in params:
+            raise ValueError('unknown parameter %r' % node.id)
+        return params[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        return OPERATORS[type(node.op)](_evaluate(node.left, params), _evaluate(node.right, params))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _evaluate(node.operand, params)
+        return -value if isinstance(node.op, ast.USub) else value
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+            and not node.keywords):
+        return FUNCTIONS[node.func.id](*(_evaluate(arg, params) for arg in node.args))
+    raise ValueError('unsupported expression %r' % ast.unparse(node))
+
+
+def coefficient(expr, params):
+    """Value of a number or of an expression over ``params``."""
+    if isinstance(expr, (int, float)):
+        return float(expr)
+    return float(_evaluate(ast.parse(expr, mode='eval'), params))
+
+
+class Equation:
+    """``sum(coef * link[t]) == factor * profile[t]`` (or ``== 0`` without profile)."""
+
+    def __init__(self, name, link_ids, coefs, profile=None, factor=1):
+        self.name = name
+        self.link_ids = np.asarray(link_ids, dtype=np.int64)
+        self.coefs = coefs
+        self.profile = profile
+        self.factor = factor
+
+
+class Topology:
+    """Compiled network description; see topology.json for the keys."""
+
+    def __init__(self, spec):
+        self.name = spec.get('name', 'energy_system')
+        # content hash of the spec, for caches keyed by the model inputs
+        self.digest = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+        self.params = dict(spec.get('params', {}))
+        self.profiles = dict(spec.get('profiles', {}))
+        self.hubs = list(spec['hubs'])
+        self.links = [(link['src'], link['dst']) for link in spec['links']]
+        self.link_index = {link: i for i, link in enumerate(self.links)}
+        if len(self.link_index) != len(self.links):
+            raise ValueError('duplicate links in topology %r' % self.name)
+        self.bounds = {}
+        for link in spec['links']:
+            lb = link.get('lb', 0.0)
+            ub = link.get('ub')
+            self.bounds[link['src'], link['dst']] = (-np.inf if lb is None else float(lb),
+                                                     np.inf if ub is None else float(ub))
+        self.storage = self.resolve(spec['storage'])
+
+        self.equations = []
+        for equation in spec.get('equations', []):
+            profile = equation.get('profile')
+            if profile is not None and profile not in self.profiles:
+                raise ValueError('equation %r uses unknown profile %r' % (equation['name'], profile))
+            terms = [(self.link_index[self.resolve(link)], coef) for link, coef in equation['terms']]
+            self.equations.append(Equation(equation['name'], [i for i, _ in terms], [c for _, c in terms],
+                                           profile, equation.get('factor', 1)))
+
+        self.envelopes = {}
+        for name, envelope in spec.get('envelopes', {}).items():
+            of = envelope['of'] if envelope['of'] == 'cum_sum' else self.resolve(envelope['of'])
+            self.envelopes[name] = (envelope['kind'], of)
+        self.totals = {name: [(self.resolve(link), coef) for link, coef in terms]
+                       for name, terms in spec.get('totals', {}).items()}
+        self.scalars = list(self.envelopes) + list(self.totals)
+        self.primary = spec['objectives']['primary']
+        self.secondary = spec['objectives']['secondary']
+        for name, terms in [(self.primary['name'], self.primary['terms'])] + list(self.secondary.items()):
+            unknown = set(terms) - set(self.scalars)
+            if unknown:
+                raise ValueError('objective %r uses unknown terms %s' % (name, sorted(unknown)))
+
+        # node incidence: link numbers entering and leaving every node
+        self.nodes = sorted({node for link in self.links for node in link})
+        self.incoming = {node: np.flatnonzero([dst == node for _, dst in self.links]) for node in self.nodes}
+        self.outgoing = {node: np.flatnonzero([src == node for src, _ in self.links]) for node in self.nodes}
+        # hub balance: incoming links count +1, outgoing links -1
+        self.hub_terms = {}
+        for hub in self.hubs:
+            if hub not in self.incoming:
+                raise ValueError('hub %r has no links' % hub)
+            ids = np.concatenate([self.incoming[hub], self.outgoing[hub]])
+            signs = np.concatenate([np.ones(len(self.incoming[hub])), -np.ones(len(self.outgoing[hub]))])
+            self.hub_terms[hub] = (ids, signs)
+        self._structures = {}
+
+    def __getstate__(self):
+        # worker processes rebuild their own structure cache
+        state = dict(self.__dict__)
+        state['_structures'] = {}
+        return state
+
+    def resolve(self, link):
+        link = tuple(link)
+        if link not in self.link_index:
+            raise ValueError('unknown link %s -> %s in topology %r' % (link + (self.name,)))
+        return link
+
+    def link_ids(self, links):
+        """Integer array of the link numbers of ``links``."""
+        return np.array([self.link_index[link] for link in links], dtype=np.int64)
+
+    def row_structure(self, link_ids, end):
+        """Cached CSR ``(indptr, indices, order)`` of per-timestep rows over ``link_ids``.
+
+        Row ``t`` holds column ``link_id * end + t`` of every link, sorted;
+        ``order`` sorts the coefficients the same way.
+        """
+        key = (tuple(link_ids), end)
+        if key not in self._structures:
+            link_ids = np.asarray(link_ids, dtype=np.int64)
+            order = np.argsort(link_ids, kind='stable')
+            t = np.arange(end, dtype=np.int64)
+            indices = (link_ids[order][None, :] * end + t[:, None]).ravel()
+            indptr = np.arange(0, len(link_ids) * end + 1, len(link_ids), dtype=np.int64)
+            for array in (indices, indptr, order):
+                array.flags.writeable = False
+            self._structures[key] = (indptr, indices, order)
+        return self._structures[key]
+
+
+_cache = {}
+
+
+def read_spec(path):
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('PyYAML is required to read %s' % path)
+        with open(path, 'r') as file:
+            return yaml.safe_load(file)
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def load_topology(path=None):
+    """Compiled Topology of ``path`` (topology.json by default), cached until the file changes."""
+    path = os.path.abspath(path or default_path)
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _cache:
+        _cache[key] = Topology(read_spec(path))
+    return _cache[key]